@@ -0,0 +1,51 @@
+import os
+import re
+import pickle
+from typing import Any
+
+
+class Checkpoint:
+    """Store intermediate results of a run, so that an interrupted run can
+    resume from the last completed step.
+
+    === Attributes ===
+    root: directory that stores the results of one run
+    """
+    # Attribute Types
+    root: str
+
+    def __init__(self, root: str) -> None:
+        """Initializer to Checkpoint.
+        """
+        self.root = root
+
+    def __str__(self) -> str:
+        """String representation of Checkpoint.
+        """
+        return f"Checkpoint: {self.root}"
+
+    def _path(self, key: str) -> str:
+        """Return the file path storing key.
+        """
+        return os.path.join(self.root, re.sub(r"[^\w.-]", "_", key) + ".pkl")
+
+    def has(self, key: str) -> bool:
+        """Return whether key has been stored.
+        """
+        return os.path.exists(self._path(key))
+
+    def load(self, key: str) -> Any:
+        """Return the result stored as key.
+        """
+        with open(self._path(key), "rb") as f:
+            return pickle.load(f)
+
+    def save(self, key: str, result: Any) -> None:
+        """Store result as key. The file is swapped in only once fully
+        written, so a killed run never leaves a broken checkpoint.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(key)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(result, f)
+        os.replace(path + ".tmp", path)
@@ -1,4 +1,6 @@
 import pandas as pd
+from datetime import date, timedelta
+from typing import List, Optional
 
 
 class DataLoader:
@@ -11,6 +13,9 @@ class DataLoader:
     etf_df: tradable tickers for ETFs with sector information
     industry_df: industry statistic for tickers in SPTSX and SPX
     tradable_path: file path for tradable stock information
+    exclusion_df: tickers that are not fetched, with market, reason and
+                  expiry date (empty for permanent exclusion)
+    exclusion_path: file path for exclusion_df
     """
     # Attribute Types
     sptsx_df: pd.DataFrame
@@ -18,6 +23,8 @@ class DataLoader:
     etf_df: pd.DataFrame
     industry_df: pd.DataFrame
     tradable_path: str
+    exclusion_df: pd.DataFrame
+    exclusion_path: str
 
     def __init__(self) -> None:
         """Initializer to DataLoader.
@@ -27,6 +34,9 @@ class DataLoader:
         self.etf_df = pd.DataFrame()
         self.industry_df = pd.DataFrame()
         self.tradable_path = "DataProcessor/tradable_list.xlsx"
+        self.exclusion_df = pd.DataFrame(
+            columns=["market", "ticker", "reason", "expiry"])
+        self.exclusion_path = "DataProcessor/exclusion.csv"
 
     def __str__(self) -> str:
         """String representation of DataLoader.
@@ -34,12 +44,60 @@ class DataLoader:
         return "Loading Data"
 
     def read_data(self) -> None:
-        """Read SPTSX, SPX, and ETF information from tradable_path.
+        """Read SPTSX, SPX, and ETF information from tradable_path, without
+        the tickers excluded in exclusion_path.
         """
+        self.read_exclusion()
         self._read_sptsx()
         self._read_spx()
         self._read_etf()
 
+    def read_exclusion(self) -> None:
+        """Read excluded tickers from exclusion_path and store results in
+        exclusion_df.
+        """
+        self.exclusion_df = pd.read_csv(self.exclusion_path, dtype=str,
+                                        keep_default_na=False)
+
+    def excluded(self, market: str) -> List[str]:
+        """Return the tickers of market whose exclusion has not expired.
+        """
+        df = self.exclusion_df
+        active = (df["expiry"] == "") | (df["expiry"] >= str(date.today()))
+        return list(df["ticker"][active & (df["market"] == market)])
+
+    def exclude(self, ticker: str, market: str, reason: str,
+                days: Optional[int] = None) -> None:
+        """Exclude ticker of market for reason, for days days or permanently
+        if days is None. A previous exclusion of ticker is replaced.
+        """
+        expiry = "" if days is None else str(date.today() + timedelta(days))
+        df = self.exclusion_df
+        df = df[(df["ticker"] != ticker) | (df["market"] != market)]
+        row = pd.DataFrame({"market": [market], "ticker": [ticker],
+                            "reason": [reason], "expiry": [expiry]})
+        self.exclusion_df = pd.concat([df, row], ignore_index=True)
+
+    def save_exclusion(self) -> None:
+        """Store exclusion_df in exclusion_path, keeping the exclusions
+        already stored there.
+        """
+        stored = pd.read_csv(self.exclusion_path, dtype=str,
+                             keep_default_na=False)
+        df = pd.concat([stored, self.exclusion_df], ignore_index=True)
+        df = df.drop_duplicates(["market", "ticker"], keep="last")
+        df.to_csv(self.exclusion_path, index=False)
+        self.exclusion_df = df
+
+    def market_of(self, ticker: str) -> str:
+        """Return the market sheet that lists ticker.
+        """
+        if ticker in self.sptsx_df.index:
+            return "SPTSX"
+        if ticker in self.spx_df.index:
+            return "SPX"
+        return "ETFs"
+
     def _read_sptsx(self) -> None:
         """Read SPTSX data from tradable_path and store results in sptsx_df.
         """
@@ -52,28 +110,8 @@ class DataLoader:
                                   sptsx_df["RPM Ticker"]]
         sptsx_df = sptsx_df.set_index("RPM Ticker")
 
-        # remove non_trackable tickers
-        non_trackable = [
-            "ABX", "ACO.X", "AD", "AFN", "ALA", "AP.UT", "APHA", "ARX",
-            "ATD", "ATZ", "AX.UT", "BAM.A", "BBD.B", "BBU.UT", "BCB", "BEI.UT",
-            "BEP.UT", "BIP.UT", "BPY.UT", "BTE", "BYD.UT", "CAR.UT", "CAS",
-            "CCA",
-            "CCL.B", "CFP", "CGX", "CHE.UT", "CHP.UT", "CHR", "CJT", "CNR",
-            "CPX", "CRR.UT", "CSH.UT", "CSU", "CTC.A", "CU", "CUF.UT", "D.UT",
-            "DGC", "DIR.UT", "DRG.UT", "DSG", "ECA", "ECN", "EFN", "EIF",
-            "EMA", "EMP.A", "EQB", "EXE", "FCR", "FEC", "FFH", "FRU",
-            "FTT", "GC", "GEI", "GIB.A", "GRT.UT", "GUD", "GWO", "HBC",
-            "HCG", "HR.UT", "HSE", "IFC", "IFP", "IIP.UT", "IMG", "INE",
-            "IPL", "IVN", "KL", "KMP.UT", "KXS", "LB", "LIF", "LNR",
-            "LUN", "MFI", "MIC", "MRE", "MRU", "MTY", "MWC", "NFI",
-            "NPI", "NVU.UT", "NWH.UT", "OGC", "ONEX", "OSB", "PVG", "PWF",
-            "PXT", "QBR.B", "RCH", "RCI.B", "REI.UT", "RUS", "SIA", "SJR.B",
-            "SMF", "SMU.UT", "SNC", "SRU.UT", "TCL.A", "TECK.B", "TIH", "TOU",
-            "TOY", "TSGI", "WCP", "WDO", "WFT", "WJA", "WN", "WPK",
-            "WSP", "WTE", "YRI", "SJ",
-            "MTL", "IAG", "TRQ", "ATA"  # this stock gives constant stock price
-        ]
-        sptsx_df.drop(non_trackable, inplace=True)
+        # remove excluded tickers
+        sptsx_df.drop(self.excluded("SPTSX"), inplace=True, errors="ignore")
         # drop unused information
         sptsx_df.drop(["Bloom.Berg Ticker"], inplace=True, axis=1)
         self.sptsx_df = sptsx_df
@@ -90,17 +128,8 @@ class DataLoader:
                                   spx_df["RPM-USTicker"]]
         spx_df = spx_df.set_index("RPM-USTicker")
 
-        # remove non_trackable tickers
-        non_trackable = [
-            "ADS", "AGN", "ALXN", "ANTM", "BBT", "BF.B", "BHGE", "BLL",
-            "BRK.B", "CBS", "CELG", "CERN", "COG", "CTL", "CXO", "DISCA",
-            "DISCK", "ETFC", "FLIR", "HFC", "INFO", "JEC", "KSU",
-            "LB", "MXIM", "MYL", "NBL", "PBCT", "RTN", "STI", "SYMC",
-            "TIF", "UTX", "VAR", "VIAB", "WCG", "WLTW", "XEC", "XLNX",
-            "T",  # T in yfinance seems to represent Telus rather than AT&T
-            "NLSN", "TWTR", "CTXS", "DRE", "ABMD", "FBHS"  # no lastest data available
-        ]
-        spx_df.drop(non_trackable, inplace=True)
+        # remove excluded tickers
+        spx_df.drop(self.excluded("SPX"), inplace=True, errors="ignore")
 
         # remove unused information
         spx_df.drop(["Bloom.B-USerg Ticker"], inplace=True, axis=1)
@@ -118,9 +147,8 @@ class DataLoader:
                                 etf_df["RPM Ticker"]]
         etf_df = etf_df.set_index("RPM Ticker")
 
-        # remove non_trackable information
-        non_trackable = ["XCB", "XGB", "XSB", "IEMG.K", "XIC", "XIU"]
-        etf_df.drop(non_trackable, inplace=True)
+        # remove excluded tickers
+        etf_df.drop(self.excluded("ETFs"), inplace=True, errors="ignore")
         # save result
         self.etf_df = etf_df
 
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from DataProcessor.DataLoader import DataLoader
+from Toolbox import stock_extraction as se
+
+
+class DataQuality:
+    """Check the price data of the whole universe at once and exclude
+    tickers with unusable data from further loading.
+
+    === Attributes ===
+    dataloader: A DataLoader that stores trade information
+    days: number of days of data checked
+    stale_days: number of trading days the last bar may lag behind
+    max_nan: largest tolerated fraction of missing bars
+    expiry: number of days an exclusion lasts before the ticker is
+            checked again
+    report: reason of exclusion for each failing ticker
+    """
+    # Attribute Types
+    dataloader: DataLoader
+    days: int
+    stale_days: int
+    max_nan: float
+    expiry: int
+    report: pd.DataFrame
+
+    def __init__(self, dataloader: DataLoader, days: int = 30,
+                 stale_days: int = 3, max_nan: float = 0.1,
+                 expiry: int = 30) -> None:
+        """Initializer to DataQuality.
+        """
+        self.dataloader = dataloader
+        self.days = days
+        self.stale_days = stale_days
+        self.max_nan = max_nan
+        self.expiry = expiry
+        self.report = pd.DataFrame()
+
+    def __str__(self) -> str:
+        """String representation of DataQuality.
+        """
+        return "Checking Data Quality"
+
+    def screen(self) -> None:
+        """Check all tickers of dataloader in one batched download, and
+        exclude failing tickers in dataloader for expiry days.
+        """
+        # setup
+        markets = {"SPTSX": self.dataloader.sptsx_df,
+                   "SPX": self.dataloader.spx_df,
+                   "ETFs": self.dataloader.etf_df}
+        tickers = [ticker for df in markets.values() for ticker in df.index]
+        ohlc = se.get_tickers_ohlc(tickers, self.days)
+        prices, volume = ohlc["Adj Close"], ohlc["Volume"]
+        # a failed download also comes back empty in the batch, so tickers
+        # without data are fetched again, with retries, one by one
+        unreachable = {}
+        for ticker in prices.columns[prices.isna().all()]:
+            try:
+                df, _ = se.get_daily_stock(ticker, self.days)
+            except se.NetworkError as e:
+                unreachable[ticker] = f"network failure: {e}"
+                continue
+            except se.DownloadError:
+                continue
+            prices[ticker] = df["Adj Close"].reindex(prices.index)
+            volume[ticker] = df["Volume"].reindex(prices.index)
+        self.report = check_panel(prices, volume, self.stale_days,
+                                  self.max_nan)
+        self.report.loc[list(unreachable), "reason"] = \
+            list(unreachable.values())
+
+        # exclude failing tickers; network failures are only reported
+        failing = self.report.index.difference(list(unreachable))
+        for market, df in markets.items():
+            failed = failing.intersection(df.index)
+            for ticker in failed:
+                self.dataloader.exclude(ticker, market,
+                                        self.report.loc[ticker, "reason"],
+                                        self.expiry)
+            markets[market] = df.drop(failed)
+        self.dataloader.save_exclusion()
+        # save results
+        self.dataloader.sptsx_df = markets["SPTSX"]
+        self.dataloader.spx_df = markets["SPX"]
+        self.dataloader.etf_df = markets["ETFs"]
+
+
+def check_panel(prices: pd.DataFrame, volume: pd.DataFrame,
+                stale_days: int = 3, max_nan: float = 0.1) -> pd.DataFrame:
+    """Return the reason of failure of each failing ticker in prices, with
+    one column per ticker. Checks are ordered by severity and only the first
+    failing check is reported.
+    """
+    valid = prices.notna()
+    has_data = valid.any()
+    # position of the last valid bar, counted from the end of the panel
+    last_valid = len(prices) - 1 - valid.to_numpy()[::-1].argmax(axis=0)
+    lag = pd.Series(len(prices) - 1 - last_valid, index=prices.columns)
+    # missing bars after the first valid bar
+    started = valid.cumsum() > 0
+    nan_share = (started & ~valid).sum() / started.sum().clip(lower=1)
+    spread = prices.max() - prices.min()
+    vol = prices.pct_change(fill_method=None).std()
+    traded = volume.reindex(columns=prices.columns).fillna(0).sum()
+
+    checks = [
+        (~has_data, "symbol mismatch: no data returned"),
+        (lag > stale_days, "stale last bar"),
+        (spread == 0, "constant price"),
+        ((vol == 0) | vol.isna(), "zero volatility"),
+        (nan_share > max_nan, "NaN gaps"),
+        (traded == 0, "no traded volume"),
+    ]
+    reason = pd.Series(np.nan, index=prices.columns, dtype=object)
+    for failed, message in checks:
+        reason = reason.where(reason.notna() | ~failed, message)
+    return pd.DataFrame({"reason": reason.dropna()})
+
+
+if __name__ == "__main__":
+    dataloader = DataLoader()
+    dataloader.read_data()
+    quality = DataQuality(dataloader)
+    quality.screen()
+    print(quality.report)
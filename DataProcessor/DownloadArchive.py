@@ -0,0 +1,159 @@
+import os
+import time
+import datetime
+import pickle
+import hashlib
+import zipfile
+import threading
+import pandas as pd
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+# name of the entry holding the time the archive was recorded
+TODAY = "today"
+
+
+class DownloadArchive:
+    """Record every download into a zip archive, or replay recorded
+    downloads from it, so that a run can be reproduced and profiled offline.
+
+    The archive keeps the time it was recorded as today, and stock_extraction
+    computes every download range from it, so a replay on any later date
+    requests exactly the recorded ranges. A download is identified by its
+    arguments and by how many identical downloads came before it, so
+    repeated downloads replay in order.
+
+    === Attributes ===
+    path: path of the zip archive
+    mode: "record" or "replay"
+    latency: seconds each replayed download waits, to mimic the network
+    today: the time the archive was recorded
+    downloads: number of downloads served
+    seconds: seconds spent on the network, or waiting in replay
+    missing: number of replayed downloads not found in the archive
+    """
+    # Attribute Types
+    path: str
+    mode: str
+    latency: float
+    today: datetime.datetime
+    downloads: int
+    seconds: float
+    missing: int
+    _count: Dict[Tuple, int]
+    _zip: Optional[zipfile.ZipFile]
+    _lock: threading.Lock
+
+    def __init__(self, path: str, mode: str = "replay",
+                 latency: float = 0.0) -> None:
+        """Initializer to DownloadArchive. Recording starts a new archive.
+        """
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.downloads = 0
+        self.seconds = 0.0
+        self.missing = 0
+        self._count = {}
+        self._zip = None
+        self._lock = threading.Lock()
+        self.today = datetime.datetime.today()
+        if mode == "record":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if os.path.exists(path):
+                os.remove(path)
+            with zipfile.ZipFile(self.path, "w") as archive:
+                archive.writestr(TODAY, self.today.isoformat())
+        elif mode == "replay":
+            with zipfile.ZipFile(self.path, "r") as archive:
+                self.today = datetime.datetime.fromisoformat(
+                    archive.read(TODAY).decode())
+        else:
+            print("No such mode; please use record or replay.")
+
+    def __str__(self) -> str:
+        """String representation of DownloadArchive.
+        """
+        return f"Download Archive: {self.mode} {self.path}"
+
+    def download(self, fetch: Callable[..., pd.DataFrame], args: tuple,
+                 kwargs: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """Return the result of fetch(*args, **kwargs), storing it when
+        recording, or the stored result when replaying. Return None if the
+        download was not recorded.
+        """
+        key = _key(args, kwargs)
+        with self._lock:
+            occurrence = self._count.get(key, 0)
+            self._count[key] = occurrence + 1
+        name = hashlib.sha1(repr(key).encode()).hexdigest()[:16] + \
+            f"-{occurrence}.pkl"
+
+        start = time.perf_counter()
+        if self.mode == "record":
+            df = fetch(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            info = zipfile.ZipInfo(name)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            # the arguments are kept readable next to each frame
+            info.comment = repr(key).encode()
+            with self._lock:
+                with zipfile.ZipFile(self.path, "a") as archive:
+                    archive.writestr(info, pickle.dumps(df))
+        else:
+            if self.latency:
+                time.sleep(self.latency)
+            df = self._replay(name, key)
+            elapsed = time.perf_counter() - start
+        with self._lock:
+            self.downloads += 1
+            self.seconds += elapsed
+        return df
+
+    def _replay(self, name: str, key: Tuple) -> Optional[pd.DataFrame]:
+        """Return the frame stored as name, or None if there is none.
+        """
+        with self._lock:
+            if self._zip is None:
+                self._zip = zipfile.ZipFile(self.path, "r")
+            try:
+                return pickle.loads(self._zip.read(name))
+            except KeyError:
+                self.missing += 1
+                print(f"Download {key} was not recorded")
+                return None
+
+    def stats(self) -> pd.Series:
+        """Return the number of downloads and the time spent on them.
+        """
+        return pd.Series({"downloads": self.downloads,
+                          "network seconds": self.seconds,
+                          "seconds per download":
+                              self.seconds / max(self.downloads, 1),
+                          "missing": self.missing})
+
+    def close(self) -> None:
+        """Close the archive.
+        """
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+
+def _key(args: tuple, kwargs: Dict[str, Any]) -> Tuple:
+    """Return the arguments of a yf.download call that change the frame.
+    """
+    kwargs = dict(kwargs)
+    tickers = args[0] if args else kwargs.pop("tickers")
+    if isinstance(tickers, str):
+        tickers = tickers.split()
+    interval = kwargs.pop("interval", "1d")
+    # dates are computed from the frozen today, so they match exactly
+    start, end = [None if date is None else pd.Timestamp(date).isoformat()
+                  for date in (kwargs.pop("start", None),
+                               kwargs.pop("end", None))]
+    # options that do not change the frame
+    for option in ["progress", "threads", "empty_ok"]:
+        kwargs.pop(option, None)
+    return (tuple(tickers), interval, start, end,
+            tuple(sorted(kwargs.items())))
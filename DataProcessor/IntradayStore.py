@@ -0,0 +1,158 @@
+import os
+import datetime
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+
+class IntradayStore:
+    """Store intraday bars as fixed-width float32 arrays in memory-mapped
+    files, so that windows of history can be served without loading the
+    whole history in RAM.
+
+    Each ticker owns two files in root:
+    - <ticker>.bars: float32 matrix with one row per bar and one column per
+      field in FIELDS
+    - <ticker>.ts: int64 UTC timestamps (nanoseconds) of each bar, sorted
+    - <ticker>.since: int64 UTC time from which the history is complete
+
+    === Attributes ===
+    root: directory that stores the memory-mapped files
+    """
+    # Attribute Types
+    root: str
+
+    FIELDS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+    def __init__(self, root: str) -> None:
+        """Initializer to IntradayStore.
+        """
+        self.root = root
+
+    def __str__(self) -> str:
+        """String representation of IntradayStore.
+        """
+        return f"Intraday Store: {self.root}"
+
+    def _path(self, ticker: str, suffix: str) -> str:
+        """Return the file path of ticker with suffix.
+        """
+        return os.path.join(self.root, f"{ticker}.{suffix}")
+
+    def _open(self, ticker: str) -> (np.ndarray, np.ndarray):
+        """Return the read-only memory-mapped timestamps and bars of ticker.
+        Both arrays are empty if ticker is not stored.
+        """
+        ts_path = self._path(ticker, "ts")
+        if not os.path.exists(ts_path) or os.path.getsize(ts_path) == 0:
+            return (np.empty(0, dtype=np.int64),
+                    np.empty((0, len(self.FIELDS)), dtype=np.float32))
+        ts = np.memmap(ts_path, dtype=np.int64, mode="r")
+        bars = np.memmap(self._path(ticker, "bars"), dtype=np.float32,
+                         mode="r", shape=(len(ts), len(self.FIELDS)))
+        return ts, bars
+
+    def coverage(self, ticker: str) -> (Optional[pd.Timestamp],
+                                        Optional[pd.Timestamp]):
+        """Return the time from which the stored history of ticker is
+        complete and the time of its latest bar, or (None, None) if ticker is
+        not stored.
+        """
+        ts, _ = self._open(ticker)
+        since_path = self._path(ticker, "since")
+        if len(ts) == 0 or not os.path.exists(since_path):
+            return None, None
+        since = np.fromfile(since_path, dtype=np.int64)[0]
+        return (pd.Timestamp(int(since), tz="UTC"),
+                pd.Timestamp(int(ts[-1]), tz="UTC"))
+
+    def resume_point(self, ticker: str, start) -> datetime.datetime:
+        """Return the time from which bars must be downloaded so that the
+        stored history of ticker covers start until now. The latest stored
+        bar is downloaded again since it may have been incomplete.
+
+        The time is naive local time, like the other download times in
+        stock_extraction, since yf.download ignores the timezone of start.
+        """
+        since, last = self.coverage(ticker)
+        if since is None or since.value > _to_utc_ns(start):
+            resume = pd.Timestamp(_to_utc_ns(start), tz="UTC")
+        else:
+            resume = last
+        # the inverse of the time.mktime conversion done by yf.download
+        return datetime.datetime.fromtimestamp(resume.value / 1e9)
+
+    def write(self, ticker: str, df: pd.DataFrame, since) -> None:
+        """Merge the bars in df, downloaded from time since onwards, into the
+        stored history of ticker. Stored bars from since onwards are replaced
+        by df.
+
+        Precondition: df has a DatetimeIndex and all columns in FIELDS,
+                      unless df is empty.
+        """
+        # failed downloads and windows without 5-minute bars come back empty,
+        # and the stored history stays as it is
+        if df.empty:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        since = _to_utc_ns(since)
+        index = df.index
+        if index.tz is None:
+            index = index.tz_localize("UTC")
+        new_ts = index.tz_convert("UTC").tz_localize(None).values.astype(
+            "datetime64[ns]").view(np.int64)
+        new_bars = df[self.FIELDS].to_numpy(dtype=np.float32)
+
+        # keep stored bars before since, unless there is a gap between the
+        # stored history and the new data
+        old_since, old_last = self.coverage(ticker)
+        old_ts, old_bars = self._open(ticker)
+        if old_last is None or old_last.value < since:
+            keep = 0
+        else:
+            keep = np.searchsorted(old_ts, since, side="left")
+            since = min(since, old_since.value)
+        ts = np.concatenate([np.asarray(old_ts[:keep]), new_ts])
+        bars = np.concatenate([np.asarray(old_bars[:keep]), new_bars])
+        order = np.argsort(ts, kind="stable")
+        ts, bars = ts[order], bars[order]
+        # drop duplicated timestamps, keeping the latest written bar
+        unique = np.append(ts[1:] != ts[:-1], True)
+        ts, bars = ts[unique], bars[unique]
+        del old_ts, old_bars
+
+        # write to new files and swap them in, so that windows still viewing
+        # the old files stay valid
+        for suffix, array in [("ts", ts), ("bars", bars),
+                              ("since", np.array([since], dtype=np.int64))]:
+            path = self._path(ticker, suffix)
+            array.tofile(path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+    def window(self, ticker: str, start: pd.Timestamp,
+               end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Return the stored bars of ticker in [start, end) as a DataFrame
+        indexed by UTC time.
+
+        The bars are a zero-copy view on the memory-mapped file, so only the
+        requested window is paged into memory.
+        """
+        ts, bars = self._open(ticker)
+        lo = np.searchsorted(ts, _to_utc_ns(start), side="left")
+        hi = len(ts) if end is None else \
+            np.searchsorted(ts, _to_utc_ns(end), side="left")
+        index = pd.DatetimeIndex(np.asarray(ts[lo:hi]).view("datetime64[ns]"),
+                                 tz="UTC")
+        return pd.DataFrame(bars[lo:hi], index=index, columns=self.FIELDS,
+                            copy=False)
+
+
+def _to_utc_ns(time) -> int:
+    """Return time as UTC nanoseconds. Naive times are taken as local time,
+    the same way datetime.datetime.today() is used in stock_extraction.
+    """
+    stamp = pd.Timestamp(time)
+    if stamp.tz is None:
+        # local time with the daylight saving offset of its own date
+        stamp = pd.Timestamp(stamp.to_pydatetime().astimezone())
+    return stamp.tz_convert("UTC").value
@@ -0,0 +1,82 @@
+import copy
+import numpy as np
+import pandas as pd
+from Strategy.Strategy import Strategy
+from typing import List
+
+
+class Rebalancer:
+    """Compare the current holding with a new holding, so that only changed
+    positions are traded and re-buffered.
+
+    === Attributes ===
+    current: current holding, with ticker, amount and location
+    target: new holding, with ticker, amount and location
+    delta: orders turning current into target, in holding format
+    changed: positions of target whose amount changed, which need a new
+             buffer, with rows of the same position summed
+    cancel: positions, labelled ticker-location, whose current buffer is
+            void, since their amount changed or they are no longer held
+    overlap: fraction of target positions carried over unchanged
+    """
+    # Attribute Types
+    current: pd.DataFrame
+    target: pd.DataFrame
+    delta: pd.DataFrame
+    changed: pd.DataFrame
+    cancel: List[str]
+    overlap: float
+
+    def __init__(self, current: pd.DataFrame, target: pd.DataFrame) -> None:
+        """Initializer to Rebalancer.
+        """
+        self.current = current
+        self.target = target
+        self.delta = pd.DataFrame()
+        self.changed = pd.DataFrame()
+        self.cancel = []
+        self.overlap = 0.0
+
+    def __str__(self) -> str:
+        """String representation of Rebalancer.
+        """
+        return "Rebalancing Holding"
+
+    def compute(self) -> None:
+        """Compute delta, changed, cancel and overlap.
+
+        Positions are matched on ticker and location, since a ticker can be
+        held on both exchanges, as in the ticker-location labels of the
+        buffers. Rows of the same position are summed.
+        """
+        # setup
+        keys = ["ticker", "location"]
+        old = self.current.groupby(keys)["amount"].sum().astype(int)
+        new = self.target.groupby(keys)["amount"].sum().astype(int)
+        positions = old.index.union(new.index)
+        old = old.reindex(positions, fill_value=0)
+        new = new.reindex(positions, fill_value=0)
+
+        # only changed positions are traded
+        diff = new - old
+        moved = diff != 0
+        columns = ["ticker", "amount", "location"]
+        self.delta = diff[moved].rename("amount").reset_index()[columns]
+        held = new != 0
+        self.changed = new[moved & held].rename("amount").reset_index()[
+            columns]
+        self.cancel = [f"{ticker}-{location}" for ticker, location in
+                       positions[(moved & (old != 0)).to_numpy()]]
+        self.overlap = 1 - len(self.changed) / held.sum() if held.any() \
+            else 0.0
+        print(f"{len(self.delta)} orders instead of {held.sum()}, "
+              f"{len(self.changed)} buffers instead of {held.sum()} "
+              f"({self.overlap:.0%} carried over)")
+
+    def restrict(self, strategy: Strategy) -> Strategy:
+        """Return a copy of strategy holding only the changed positions, so
+        that a ProtectionBuffer on it quotes and buffers only those.
+        """
+        restricted = copy.copy(strategy)
+        restricted.holding = self.changed
+        return restricted
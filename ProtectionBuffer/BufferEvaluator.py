@@ -0,0 +1,182 @@
+from ProtectionBuffer.ProtectionBuffer import ProtectionBuffer as PB
+from Strategy.Strategy import Strategy
+import pandas as pd
+import numpy as np
+from Toolbox import stock_extraction as se
+from typing import Dict, List, Optional
+
+
+def simulate_paths(stock_prices: pd.DataFrame, days: int, n_paths: int,
+                   seed: Optional[int] = None) -> np.ndarray:
+    """Return n_paths correlated price paths of days daily bars for every
+    ticker in stock_prices, relative to the latest price.
+
+    Log returns are drawn from a multivariate normal distribution with the
+    historical mean and covariance of stock_prices. The result has shape
+    (n_paths, days, number of tickers).
+    """
+    log_return = np.log(stock_prices).diff().dropna().to_numpy()
+    mu = log_return.mean(axis=0)
+    cov = np.atleast_2d(np.cov(log_return, rowvar=False))
+    # eigen decomposition tolerates the singular covariance of highly
+    # correlated tickers, where Cholesky fails
+    eig_val, eig_vec = np.linalg.eigh(cov)
+    factor = (eig_vec * np.sqrt(np.clip(eig_val, 0, None))).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    z = rng.standard_normal((n_paths, days, len(mu)), dtype=np.float32)
+    steps = z @ factor.T + mu.astype(np.float32)
+    return np.exp(np.cumsum(steps, axis=1))
+
+
+def stop_paths(paths: np.ndarray, amounts: np.ndarray, tolerance: np.ndarray,
+               depth: np.ndarray, fraction: np.ndarray) -> \
+        (np.ndarray, np.ndarray):
+    """Return the return of each ticker on each day of each path with a
+    ladder of stop orders, and whether each layer of each ticker is
+    triggered on each path.
+
+    paths holds prices relative to the latest price, with shape (paths,
+    days, tickers). amounts are signed quantities, tolerance is per ticker,
+    and depth and fraction describe the layers as in
+    ProtectionBuffer.layer_schedule. Stops are filled at the close of the
+    first bar that crosses them, and the return of a layer is fixed from
+    then on.
+    """
+    # mirror short positions, so that every position is stopped by a fall
+    value = np.where(amounts > 0, paths, 2 - paths)
+    running_min = np.minimum.accumulate(value, axis=1)
+    move = np.zeros(paths.shape, dtype=paths.dtype)
+    triggered = np.zeros((paths.shape[0], len(depth), paths.shape[2]),
+                         dtype=bool)
+
+    for i in range(len(depth)):
+        # the running minimum makes hit true from the first crossing on
+        hit = running_min <= 1 - tolerance * depth[i]
+        triggered[:, i, :] = hit[:, -1, :]
+        first = hit.argmax(axis=1)[:, np.newaxis, :]
+        exit_value = np.take_along_axis(value, first, axis=1)
+        move += fraction[i] * (np.where(hit, exit_value, value) - 1)
+    return move, triggered
+
+
+def stop_pnl(paths: np.ndarray, amounts: np.ndarray, prices: np.ndarray,
+             tolerance: np.ndarray, depth: np.ndarray,
+             fraction: np.ndarray) -> (np.ndarray, np.ndarray):
+    """Return the P&L of each path with a ladder of stop orders, and whether
+    each layer of each ticker is triggered on each path.
+
+    The arguments are as in stop_paths, and prices are the latest prices.
+    """
+    move, triggered = stop_paths(paths, amounts, tolerance, depth, fraction)
+    position = np.abs(amounts) * prices
+    return (move[:, -1, :] * position).sum(axis=1), triggered
+
+
+class BufferEvaluator:
+    """Evaluate ProtectionBuffer designs on simulated price paths of the
+    strategy holding.
+
+    === Attributes ===
+    strategy: A strategy that holds the calculated strategy holding
+    days: number of trading days simulated
+    n_paths: number of simulated paths
+    history: number of days of price history used for the covariance
+    seed: seed of the random generator
+    report: KPI's of each buffer design
+    pnl: P&L of each simulated path for each buffer design
+    """
+    # Attribute Types
+    strategy: Strategy
+    days: int
+    n_paths: int
+    history: int
+    seed: Optional[int]
+    report: pd.DataFrame
+    pnl: Dict[str, np.ndarray]
+
+    def __init__(self, strategy: Strategy, days: int = 5,
+                 n_paths: int = 10000, history: int = 250,
+                 seed: Optional[int] = None) -> None:
+        """Initializer to BufferEvaluator.
+        """
+        self.strategy = strategy
+        self.days = days
+        self.n_paths = n_paths
+        self.history = history
+        self.seed = seed
+        self.report = pd.DataFrame()
+        self.pnl = {}
+
+    def __str__(self) -> str:
+        """String representation of BufferEvaluator.
+        """
+        return f"Evaluating Buffers: {self.n_paths} paths x {self.days} days"
+
+    def evaluate(self, buffers: List[PB]) -> None:
+        """Simulate the holding once and evaluate every buffer in buffers on
+        the same paths. Store results in report and pnl.
+        """
+        # setup
+        holding = self.strategy.holding.set_index("ticker")
+        stock_prices = se.get_tickers_spec(list(holding.index), "Adj Close",
+                                           self.history)
+        tickers = list(stock_prices.columns)
+        missing = set(holding.index) - set(tickers)
+        if missing:
+            print("No price history for " + ", ".join(sorted(missing)))
+        amounts = holding.loc[tickers, "amount"].to_numpy(dtype=float)
+        prices = stock_prices.iloc[-1].to_numpy(dtype=float)
+        paths = simulate_paths(stock_prices, self.days, self.n_paths,
+                               self.seed)
+
+        # evaluate every design on the same paths
+        long = amounts > 0
+        final = paths[:, -1, :]
+        move = np.where(long, final - 1, 1 - final)
+        self.pnl = {"No Buffer": (move * np.abs(amounts) * prices).sum(axis=1)}
+        rows = {"No Buffer": self._summarize(self.pnl["No Buffer"], None)}
+        for buffer in buffers:
+            depth, fraction = buffer.layer_schedule()
+            pnl, triggered = stop_pnl(paths, amounts, prices,
+                                      buffer.ticker_tolerance(tickers),
+                                      depth, fraction)
+            self.pnl[str(buffer)] = pnl
+            rows[str(buffer)] = self._summarize(pnl, triggered)
+        # save results
+        self.report = pd.DataFrame.from_dict(rows, orient="index")
+
+    def _summarize(self, pnl: np.ndarray,
+                   triggered: Optional[np.ndarray]) -> Dict[str, float]:
+        """Return KPI's of the P&L distribution pnl, with the trigger rates
+        of triggered if given.
+        """
+        var = np.percentile(pnl, 5)
+        summary = {
+            "expected P&L": pnl.mean(),
+            "expected loss": -np.minimum(pnl, 0).mean(),
+            "VaR 95%": -var,
+            "CVaR 95%": -pnl[pnl <= var].mean(),
+            "P&L 5%": var,
+            "P&L 50%": np.percentile(pnl, 50),
+            "P&L 95%": np.percentile(pnl, 95),
+            "any trigger rate": np.nan,
+            "layer trigger rate": np.nan,
+        }
+        if triggered is not None:
+            summary["any trigger rate"] = triggered.any(axis=(1, 2)).mean()
+            summary["layer trigger rate"] = triggered.mean()
+        return summary
+
+
+if __name__ == "__main__":
+    from DataProcessor.DataLoader import DataLoader
+    from ProtectionBuffer.FullStopOrderBuffer import FullStopOrderBuffer
+    from ProtectionBuffer.LadderStopOrderBuffer import LadderStopOrderBuffer
+    strategy = Strategy(DataLoader(), 1200000)
+    strategy.holding = pd.DataFrame({"ticker": ["AAPL", "MSFT", "JPM"],
+                                     "amount": [1000, 800, -500],
+                                     "location": ["US", "US", "US"]})
+    evaluator = BufferEvaluator(strategy, seed=0)
+    evaluator.evaluate([FullStopOrderBuffer(strategy, 0.05),
+                        LadderStopOrderBuffer(strategy, 0.08, 4, "geom")])
+    print(evaluator.report)
@@ -4,20 +4,24 @@ import pandas as pd
 import numpy as np
 from Toolbox import stock_extraction as se
 from tqdm import tqdm
+from typing import Optional
 
 
 class FullStopOrderBuffer(PB):
     """A ProtectionBuffer that full insures the holding
     """
 
-    def __init__(self, strategy: Strategy, tolerance: float) -> None:
+    def __init__(self, strategy: Strategy, tolerance: float,
+                 atr_multiple: Optional[float] = None) -> None:
         """Initializer to StopOrderBuffer.
         """
-        PB.__init__(self, strategy, tolerance)
+        PB.__init__(self, strategy, tolerance, atr_multiple)
 
     def __str__(self) -> str:
         """String representation of StopOrderBuffer.
         """
+        if self.atr_multiple is not None:
+            return f"Stop Order Buffer: {self.atr_multiple} ATR"
         return "Stop Order Buffer"
 
     def create_buffer(self) -> None:
@@ -25,7 +29,13 @@ class FullStopOrderBuffer(PB):
         """
         holding = self.strategy.holding
         holding = holding.set_index("ticker")
+        if holding.empty:
+            # no position changed, so no stop order is needed
+            self.buffer = pd.DataFrame(columns=self.COLUMNS)
+            return
         buffer_list = []
+        tolerance = dict(zip(holding.index,
+                             self.ticker_tolerance(list(holding.index))))
 
         for ticker in tqdm(holding.index):
             amount = holding.loc[ticker, "amount"]
@@ -38,7 +48,15 @@ class FullStopOrderBuffer(PB):
                               "Buy/Sell": np.where(sign, "Sell", "Buy"),
                               "Quantity": [amount],
                               "Type": ["STOP"],
-                              "Price": [price * (1 - self.tolerance)]
+                              # short positions are stopped above the market
+                              "Price": [price * np.where(
+                                  sign, 1 - tolerance[ticker],
+                                  1 + tolerance[ticker])]
                               })
             )
         self.buffer = pd.concat(buffer_list)
+
+    def layer_schedule(self) -> (np.ndarray, np.ndarray):
+        """Inherited method from ProtectionBuffer.
+        """
+        return np.array([1.0]), np.array([1.0])
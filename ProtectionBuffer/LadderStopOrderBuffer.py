@@ -4,32 +4,53 @@ import pandas as pd
 from Toolbox import stock_extraction as se
 import numpy as np
 from tqdm import tqdm
+from typing import Optional
 
 
 class LadderStopOrderBuffer(PB):
 
-    def __init__(self, strategy: Strategy, tolerance: float, layer: int, method: str) -> None:
+    def __init__(self, strategy: Strategy, tolerance: float, layer: int,
+                 method: str, atr_multiple: Optional[float] = None) -> None:
         """Initializer to StopOrderBuffer.
         """
-        PB.__init__(self, strategy, tolerance)
+        PB.__init__(self, strategy, tolerance, atr_multiple)
         self.layer = layer
         self.method = method
 
     def __str__(self) -> str:
         """String representation of StopOrderBuffer.
         """
+        if self.atr_multiple is not None:
+            return f"Ladder Stop Order Buffer: {self.layer} {self.method} " \
+                   f"{self.atr_multiple} ATR"
         return f"Ladder Stop Order Buffer: {self.layer} {self.method}"
 
     def create_buffer(self) -> None:
         """Inherited method from ProtectionBuffer.
         """
-        if self.method == "equal":
+        if self.strategy.holding.empty:
+            # no position changed, so no stop order is needed
+            self.buffer = pd.DataFrame(columns=self.COLUMNS)
+        elif self.method == "equal":
             self._equal_buffer()
         elif self.method == "geom":
             self._geometric_half_buffer()
         else:
             print("No such method; please use other available options.")
 
+    def layer_schedule(self) -> (np.ndarray, np.ndarray):
+        """Inherited method from ProtectionBuffer.
+        """
+        depth = np.arange(1, self.layer + 1) / self.layer
+        if self.method == "geom":
+            # each layer takes half of the previous one, and the last layer
+            # takes the remainder
+            fraction = 0.5 ** np.arange(1, self.layer + 1)
+            fraction[-1] = fraction[-2] if self.layer > 1 else 1.0
+        else:
+            fraction = np.full(self.layer, 1 / self.layer)
+        return depth, fraction
+
     def _equal_buffer(self) -> None:
         """Equally split the buffer into self.layer layers, with arithmetic
         progressive tolerance rate.
@@ -37,18 +58,21 @@ class LadderStopOrderBuffer(PB):
         holding = self.strategy.holding
         holding = holding.set_index("ticker")
         buffer_list = []
+        tolerance = self.ticker_tolerance(list(holding.index))
 
-        for ticker in tqdm(holding.index):
+        for ticker, tol in zip(tqdm(holding.index), tolerance):
             amount = holding.loc[ticker, "amount"]
             # if the holding is a buy signal, sign is 1
             amount, sign = round(abs(amount) / self.layer),\
                 np.where(amount > 0, "Sell", "Buy")
+            price = se.get_current_price(ticker)
 
             # build each layer
             for i in range(1, self.layer + 1):
                 buffer_list.append(
                     self._single_buffer(i, ticker, str(sign), amount,
-                                        holding.loc[ticker, "location"])
+                                        holding.loc[ticker, "location"],
+                                        price, tol)
                 )
         self.buffer = pd.concat(buffer_list)
 
@@ -59,10 +83,12 @@ class LadderStopOrderBuffer(PB):
         holding = self.strategy.holding
         holding = holding.set_index("ticker")
         buffer_list = []
+        tolerance = self.ticker_tolerance(list(holding.index))
 
-        for ticker in tqdm(holding.index):
+        for ticker, tol in zip(tqdm(holding.index), tolerance):
             amount = holding.loc[ticker, "amount"]
             amount, sign = abs(amount), np.where(amount > 0, "Sell", "Buy")
+            price = se.get_current_price(ticker)
             # build each layer
             for i in range(1, self.layer + 1):
                 if i < self.layer:
@@ -70,17 +96,20 @@ class LadderStopOrderBuffer(PB):
                 # append result
                 buffer_list.append(
                     self._single_buffer(i, ticker, str(sign), amount,
-                                        holding.loc[ticker, "location"])
+                                        holding.loc[ticker, "location"],
+                                        price, tol)
                 )
         # store result
         self.buffer = pd.concat(buffer_list)
 
     def _single_buffer(self, i: int, ticker: str, sign: str, amount: int,
-                       location: str) -> pd.DataFrame:
+                       location: str, price: float,
+                       tolerance: float) -> pd.DataFrame:
         """Return the inputs into desired form of DataFrame.
         """
-        ratio = 1 - (self.tolerance * i / self.layer)
-        price = se.get_current_price(ticker)
+        ratio = tolerance * i / self.layer
+        # short positions are stopped by Buy orders above the market
+        ratio = 1 + ratio if sign == "Buy" else 1 - ratio
         return pd.DataFrame(
                 {"Ticker": [ticker + "-" + location],
                  "Buy/Sell": sign,
@@ -1,14 +1,48 @@
 from ProtectionBuffer.ProtectionBuffer import ProtectionBuffer as PB
 import pandas as pd
+import numpy as np
 from Strategy.Strategy import Strategy
+from Toolbox import stock_extraction as se
+from Toolbox import kpi
+from Toolbox.option_pricing import black_scholes
+from typing import List
 
 
 class OptionBuffer(PB):
+    """A ProtectionBuffer that insures the holding with protective options:
+    puts for long positions and calls for short positions.
 
-    def __init__(self, strategy: Strategy, tolerance: float) -> None:
+    === Attributes ===
+    expiries: candidate days to expiry, each moved to the Friday on or after
+              it, when listed options expire
+    strike_num: number of candidate strikes between at the money and
+                tolerance out of the money
+    horizon: minimal days to expiry that protects the holding
+    history: number of days of price history used for volatility
+    rf: risk-free rate
+    greeks: price and greeks of the chosen option of each ticker
+    """
+    # Attribute Types
+    expiries: List[int]
+    strike_num: int
+    horizon: int
+    history: int
+    rf: float
+    greeks: pd.DataFrame
+
+    def __init__(self, strategy: Strategy, tolerance: float,
+                 expiries: List[int] = (7, 14, 30, 60, 90),
+                 strike_num: int = 21, horizon: int = 7,
+                 history: int = 100, rf: float = 0.04) -> None:
         """Initializer to OptionBuffer.
         """
         PB.__init__(self, strategy, tolerance)
+        self.expiries = list(expiries)
+        self.strike_num = strike_num
+        self.horizon = horizon
+        self.history = history
+        self.rf = rf
+        self.greeks = pd.DataFrame()
 
     def __str__(self) -> str:
         """String representation of OptionBuffer.
@@ -16,4 +50,90 @@ class OptionBuffer(PB):
         return "Option Buffer"
 
     def create_buffer(self) -> None:
-        pass
+        """Inherited method from ProtectionBuffer.
+
+        Price every strike and expiry for every holding in one pass, and
+        choose for each ticker the cheapest option whose strike distance
+        plus premium stays within tolerance.
+        """
+        # setup
+        holding = self.strategy.holding.set_index("ticker")
+        if holding.empty:
+            # no position changed, so no option is needed
+            self.buffer = pd.DataFrame(columns=self.COLUMNS + [
+                "Option", "Strike", "Expiry"])
+            return
+        stock_prices = se.get_tickers_spec(list(holding.index), "Adj Close",
+                                           self.history)
+        today = pd.Timestamp(se.today()).normalize()
+        expiry_dates = [_friday(today + pd.Timedelta(days=days))
+                        for days in self.expiries]
+        tickers = list(stock_prices.columns)
+        missing = set(holding.index) - set(tickers)
+        if missing:
+            print("No price history for " + ", ".join(sorted(missing)))
+        holding = holding.loc[tickers]
+        amount = holding["amount"].to_numpy(dtype=float)
+
+        # grid of shape (tickers, strikes, expiries)
+        spot = stock_prices.iloc[-1].to_numpy(dtype=float)[:, None, None]
+        sigma = kpi.volatility_series(stock_prices).to_numpy()[:, None, None]
+        call = (amount < 0)[:, None, None]
+        side = np.where(call, 1, -1)
+        distance = (self.tolerance
+                    * np.linspace(0, 1, self.strike_num))[None, :, None]
+        strike = spot * (1 + side * distance)
+        expiry = np.array([(date - today).days for date in expiry_dates],
+                          dtype=float)[None, None, :]
+        option = black_scholes(spot, strike, expiry / 365, sigma, self.rf,
+                               call)
+
+        # worst loss per share is the strike distance plus the premium
+        loss = distance + option["price"] / spot
+        feasible = (loss <= self.tolerance) & (expiry >= self.horizon)
+        cost = np.where(feasible, option["price"], np.inf)
+        cost = cost.reshape(len(tickers), -1)
+        choice = cost.argmin(axis=1)
+        no_option = ~np.isfinite(cost.min(axis=1))
+        if no_option.any():
+            # fall back to the option with the least worst loss
+            print("No option meets tolerance for "
+                  + ", ".join(np.array(tickers)[no_option]))
+            fallback = np.where(expiry >= self.horizon, loss, np.inf)
+            fallback = fallback.reshape(len(tickers), -1).argmin(axis=1)
+            choice = np.where(no_option, fallback, choice)
+
+        # gather the chosen option of each ticker
+        rows = np.arange(len(tickers))
+        chosen = {key: np.broadcast_to(value, loss.shape).reshape(
+            len(tickers), -1)[rows, choice] for key, value in option.items()}
+        chosen["strike"] = np.broadcast_to(strike, loss.shape).reshape(
+            len(tickers), -1)[rows, choice]
+        chosen["expiry"] = np.broadcast_to(expiry, loss.shape).reshape(
+            len(tickers), -1)[rows, choice].astype(int)
+        self.greeks = pd.DataFrame(chosen, index=tickers)
+
+        # save results in Buying template format, with the contract itself
+        # as the ticker, so that the row is never read as shares
+        dates = today + pd.to_timedelta(chosen["expiry"], unit="D")
+        kind = np.where(amount < 0, "C", "P")
+        underlying = holding.index + "-" + holding["location"]
+        contract = [f"{name} {date:%Y-%m-%d} {k} {strike:.2f}"
+                    for name, date, k, strike in
+                    zip(underlying, dates, kind, chosen["strike"])]
+        self.buffer = pd.DataFrame({
+            "Ticker": contract,
+            "Buy/Sell": "Buy",
+            "Quantity": np.ceil(np.abs(amount) / 100).astype(int),
+            "Type": "LMT",
+            "Price": chosen["price"],
+            "Option": np.where(amount < 0, "CALL", "PUT"),
+            "Strike": chosen["strike"],
+            "Expiry": dates.date,
+        }).reset_index(drop=True)
+
+
+def _friday(date: pd.Timestamp) -> pd.Timestamp:
+    """Return the Friday on or after date.
+    """
+    return date + pd.Timedelta(days=(4 - date.dayofweek) % 7)
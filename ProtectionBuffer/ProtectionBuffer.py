@@ -1,5 +1,9 @@
 from Strategy.Strategy import Strategy
 import pandas as pd
+import numpy as np
+from Toolbox import stock_extraction as se
+from Toolbox import technical_indicator as ti
+from typing import Dict, List, Optional
 
 
 class ProtectionBuffer:
@@ -9,18 +13,29 @@ class ProtectionBuffer:
     strategy: A strategy that holds the calculated strategy holding
     buffer: store the buffer
     tolerance: percentage of tolerated loss
+    atr_multiple: if given, the tolerated loss of each ticker is this many
+                  ATR's below its price instead of tolerance
+    ohlc: daily OHLC data of the holding, fetched once for all tickers
     """
     # Attribute Types
     strategy: Strategy
     buffer: pd.DataFrame
     tolerance: float
+    atr_multiple: Optional[float]
+    ohlc: Dict[str, pd.DataFrame]
 
-    def __init__(self, strategy: Strategy, tolerance: float) -> None:
+    # columns of a buffer in Buying template format
+    COLUMNS = ["Ticker", "Buy/Sell", "Quantity", "Type", "Price"]
+
+    def __init__(self, strategy: Strategy, tolerance: float,
+                 atr_multiple: Optional[float] = None) -> None:
         """Initializer to ProtectionBuffer.
         """
         self.strategy = strategy
         self.buffer = pd.DataFrame()
         self.tolerance = tolerance
+        self.atr_multiple = atr_multiple
+        self.ohlc = {}
 
     def __str__(self) -> str:
         """String representation of ProtectionBuffer.
@@ -32,6 +47,36 @@ class ProtectionBuffer:
         """
         raise NotImplementedError
 
+    def layer_schedule(self) -> (np.ndarray, np.ndarray):
+        """Return the depth of each stop layer as a fraction of the
+        tolerance, and the fraction of the position each layer closes.
+        """
+        raise NotImplementedError
+
+    def ticker_tolerance(self, tickers: List[str]) -> np.ndarray:
+        """Return the tolerated loss of each ticker in tickers.
+
+        With atr_multiple, the loss is atr_multiple ATR's relative to the
+        latest close, computed for all tickers in one pass over ohlc.
+        Tickers without enough data fall back to tolerance.
+        """
+        tolerance = np.full(len(tickers), self.tolerance)
+        if self.atr_multiple is None or not tickers:
+            return tolerance
+        missing = [ticker for ticker in tickers if ticker not in
+                   self.ohlc.get("Adj Close", pd.DataFrame()).columns]
+        if missing:
+            # fetch all tickers together so the data is downloaded only once
+            self.ohlc = se.get_tickers_ohlc(
+                sorted(set(tickers) | set(self.ohlc.get("Adj Close", {}))), 60)
+        close = self.ohlc["Adj Close"][tickers]
+        atr = ti.atr_panel(self.ohlc["High"][tickers],
+                           self.ohlc["Low"][tickers], close)
+        adaptive = (self.atr_multiple * atr.ffill().iloc[-1]
+                    / close.ffill().iloc[-1]).to_numpy()
+        return np.where(np.isfinite(adaptive) & (adaptive > 0),
+                        np.clip(adaptive, 0, 1), tolerance)
+
     def remove_zero_buffer(self) -> None:
         """Remove all non-zero entries in self.buffer.
         """
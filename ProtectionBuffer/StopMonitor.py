@@ -0,0 +1,309 @@
+import time
+import asyncio
+import bisect
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from Toolbox import stock_extraction as se
+from typing import Dict, List, NamedTuple, Optional
+
+
+class TriggerEvent(NamedTuple):
+    """A stop layer hit by a quote.
+    """
+    ticker: str
+    side: str
+    quantity: int
+    level: float
+    price: float
+    # seconds from requesting the quote to emitting the event
+    latency: float
+    time: pd.Timestamp
+
+
+class QuoteFeed:
+    """A template for a source of the latest price of a ticker.
+    """
+
+    async def quote(self, ticker: str) -> Optional[float]:
+        """Return the latest price of ticker, or None if there is none.
+        """
+        raise NotImplementedError
+
+    async def quotes(self, tickers: List[str]) -> Dict[str, Optional[float]]:
+        """Return the latest price of each ticker in tickers, or None if
+        there is none. Quotes all tickers concurrently by default.
+        """
+        prices = await asyncio.gather(*[self.quote(ticker)
+                                        for ticker in tickers])
+        return dict(zip(tickers, prices))
+
+    def finished(self, ticker: str) -> bool:
+        """Return whether the feed has no more quotes for ticker. A live feed
+        never finishes, and a missing quote is only a missed poll.
+        """
+        return False
+
+    def close(self) -> None:
+        """Release the resources of the feed.
+        """
+        pass
+
+
+class YFinanceFeed(QuoteFeed):
+    """Quote the latest intraday price from yfinance, with one batched
+    download for all tickers of a poll.
+
+    yf.download keeps module-global state and is not thread-safe, so the
+    downloads run one at a time on a single thread, off the event loop.
+
+    === Attributes ===
+    executor: the thread running the downloads
+    """
+    # Attribute Types
+    executor: ThreadPoolExecutor
+
+    def __init__(self) -> None:
+        """Initializer to YFinanceFeed.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def quote(self, ticker: str) -> Optional[float]:
+        """Inherited method from QuoteFeed.
+        """
+        return (await self.quotes([ticker]))[ticker]
+
+    async def quotes(self, tickers: List[str]) -> Dict[str, Optional[float]]:
+        """Inherited method from QuoteFeed.
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(self.executor,
+                                              se.get_current_prices, tickers)
+        except Exception as e:
+            print(f"No quotes for {len(tickers)} tickers ({e})")
+            return {ticker: None for ticker in tickers}
+
+    def close(self) -> None:
+        """Inherited method from QuoteFeed.
+        """
+        self.executor.shutdown(wait=False)
+
+
+class ReplayFeed(QuoteFeed):
+    """Replay recorded prices, one row per poll, for testing without a
+    network. A ticker is finished once all of its rows are replayed.
+
+    === Attributes ===
+    prices: prices with one row per tick and one column per ticker
+    delay: seconds each quote takes, to mimic a network round trip
+    """
+    # Attribute Types
+    prices: pd.DataFrame
+    delay: float
+    _position: Dict[str, int]
+
+    def __init__(self, prices: pd.DataFrame, delay: float = 0.0) -> None:
+        """Initializer to ReplayFeed.
+        """
+        self.prices = prices
+        self.delay = delay
+        self._position = {}
+
+    async def quote(self, ticker: str) -> Optional[float]:
+        """Inherited method from QuoteFeed.
+        """
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.finished(ticker):
+            return None
+        position = self._position.get(ticker, 0)
+        self._position[ticker] = position + 1
+        price = self.prices[ticker].iloc[position]
+        return None if pd.isna(price) else float(price)
+
+    def finished(self, ticker: str) -> bool:
+        """Inherited method from QuoteFeed.
+        """
+        return ticker not in self.prices.columns or \
+            self._position.get(ticker, 0) >= len(self.prices)
+
+
+class StopMonitor:
+    """Watch the stop layers of a buffer against a quote feed, polling all
+    tickers at once with asyncio.
+
+    The stop levels of each ticker are kept sorted, so each quote is checked
+    with a binary search. A Sell stop triggers when the price falls to its
+    level, and a Buy stop when the price rises to its level. Each layer
+    triggers once.
+
+    === Attributes ===
+    feed: the source of quotes
+    interval: seconds between the start of two polls
+    sell: level and quantity of the Sell stops of each ticker, by level
+    buy: level and quantity of the Buy stops of each ticker, by level
+    events: all triggered stops, in order
+    latency: seconds taken by the quotes of each poll
+    cycles: seconds taken by each poll of all tickers
+    missed: number of quotes the feed had no price for
+    """
+    # Attribute Types
+    feed: QuoteFeed
+    interval: float
+    sell: Dict[str, List[tuple]]
+    buy: Dict[str, List[tuple]]
+    events: List[TriggerEvent]
+    latency: List[float]
+    cycles: List[float]
+    missed: int
+
+    def __init__(self, buffer: pd.DataFrame, feed: QuoteFeed,
+                 interval: float = 1.0) -> None:
+        """Initializer to StopMonitor. buffer is in the format created by
+        ProtectionBuffer, and only its STOP rows are watched.
+        """
+        self.feed = feed
+        self.interval = interval
+        self.sell = {}
+        self.buy = {}
+        self.events = []
+        self.latency = []
+        self.cycles = []
+        self.missed = 0
+        stops = buffer[(buffer["Type"] == "STOP") & (buffer["Quantity"] != 0)]
+        for label, side, quantity, level in zip(
+                stops["Ticker"], stops["Buy/Sell"], stops["Quantity"],
+                stops["Price"]):
+            # tickers are labelled as ticker-location in the buffer
+            ticker = label.rsplit("-", 1)[0]
+            book = self.sell if side == "Sell" else self.buy
+            bisect.insort(book.setdefault(ticker, []),
+                          (float(level), int(quantity)))
+
+    def __str__(self) -> str:
+        """String representation of StopMonitor.
+        """
+        return f"Monitoring {len(self.tickers())} Tickers"
+
+    def tickers(self) -> List[str]:
+        """Return the tickers with stops still waiting.
+        """
+        return sorted(ticker for ticker in set(self.sell) | set(self.buy)
+                      if self.sell.get(ticker) or self.buy.get(ticker))
+
+    def check(self, ticker: str, price: float,
+              start: Optional[float] = None) -> List[TriggerEvent]:
+        """Trigger and remove the stops of ticker hit by price. start is the
+        perf_counter time the quote was requested.
+        """
+        start = time.perf_counter() if start is None else start
+        hit = []
+        sell = self.sell.get(ticker, [])
+        # Sell stops at or above price
+        i = bisect.bisect_left(sell, (price, -np.inf))
+        hit += [("Sell", level) for level in sell[i:]]
+        del sell[i:]
+        buy = self.buy.get(ticker, [])
+        # Buy stops at or below price
+        j = bisect.bisect_right(buy, (price, np.inf))
+        hit += [("Buy", level) for level in buy[:j]]
+        del buy[:j]
+
+        now = pd.Timestamp.now()
+        events = [TriggerEvent(ticker, side, quantity, level, price,
+                               time.perf_counter() - start, now)
+                  for side, (level, quantity) in hit]
+        for event in events:
+            print(f"{event.time:%H:%M:%S} {event.side} {event.quantity} "
+                  f"{ticker} at {price: .2f} (stop {event.level: .2f})")
+        self.events += events
+        return events
+
+    async def _poll(self, tickers: List[str]) -> None:
+        """Quote tickers once and check their stops.
+        """
+        start = time.perf_counter()
+        prices = await self.feed.quotes(tickers)
+        self.latency.append(time.perf_counter() - start)
+        for ticker, price in prices.items():
+            if price is None:
+                # a missed quote is polled again in the next cycle
+                self.missed += 1
+            else:
+                self.check(ticker, price, start)
+
+    async def run(self, cycles: Optional[int] = None) -> None:
+        """Poll all tickers every interval seconds, for cycles polls or until
+        no stop is waiting on a ticker the feed still quotes.
+        """
+        count = 0
+        while cycles is None or count < cycles:
+            tickers = [ticker for ticker in self.tickers()
+                       if not self.feed.finished(ticker)]
+            if not tickers:
+                break
+            start = time.perf_counter()
+            await self._poll(tickers)
+            elapsed = time.perf_counter() - start
+            self.cycles.append(elapsed)
+            count += 1
+            await asyncio.sleep(max(0.0, self.interval - elapsed))
+
+    def watch(self, cycles: Optional[int] = None) -> None:
+        """Run the monitor until it stops, and release the feed.
+        """
+        try:
+            asyncio.run(self.run(cycles))
+        finally:
+            self.feed.close()
+
+    def report(self) -> pd.DataFrame:
+        """Return all triggered stops.
+        """
+        return pd.DataFrame(self.events, columns=TriggerEvent._fields)
+
+    def metrics(self) -> pd.Series:
+        """Return the latency statistics of the quotes and polls, in
+        seconds.
+        """
+        latency = np.asarray(self.latency)
+        cycles = np.asarray(self.cycles)
+        if not len(latency):
+            return pd.Series(dtype=float)
+        events = np.array([event.latency for event in self.events])
+        return pd.Series({
+            "polls": len(cycles),
+            "missed quotes": self.missed,
+            "quote mean": latency.mean(),
+            "quote p95": np.percentile(latency, 95),
+            "quote max": latency.max(),
+            "poll mean": cycles.mean() if len(cycles) else np.nan,
+            "poll max": cycles.max() if len(cycles) else np.nan,
+            "overrun polls": int((cycles > self.interval).sum()),
+            "trigger p95": np.percentile(events, 95) if len(events)
+            else np.nan,
+        })
+
+
+def read_buffer(path: str) -> pd.DataFrame:
+    """Return the orders stored by DataStorer.store_buy in path.
+    """
+    return pd.read_excel(path, sheet_name="buy")
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    tickers = [f"T{i}" for i in range(150)]
+    quotes = pd.DataFrame(
+        100 * np.exp(np.cumsum(rng.normal(0, 0.01, (50, 150)), axis=0)),
+        columns=tickers)
+    buffer = pd.DataFrame({"Ticker": [t + "-US" for t in tickers for _ in
+                                      range(3)],
+                           "Buy/Sell": "Sell", "Quantity": 10, "Type": "STOP",
+                           "Price": np.tile([97.0, 95.0, 93.0], 150)})
+    monitor = StopMonitor(buffer, ReplayFeed(quotes, delay=0.05),
+                          interval=0.2)
+    monitor.watch()
+    print(monitor.report())
+    print(monitor.metrics())
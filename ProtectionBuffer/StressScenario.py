@@ -0,0 +1,195 @@
+from ProtectionBuffer.ProtectionBuffer import ProtectionBuffer as PB
+from ProtectionBuffer.BufferEvaluator import stop_paths
+from DataProcessor.Checkpoint import Checkpoint
+from Strategy.Strategy import Strategy
+import pandas as pd
+import numpy as np
+from Toolbox import stock_extraction as se
+from typing import Dict, List, Optional, Tuple
+
+# historical shocks, from the last close before the shock to its trough
+SCENARIOS = {
+    "2015 China Devaluation": ("2015-08-10", "2015-08-25"),
+    "2018 Volmageddon": ("2018-01-26", "2018-02-08"),
+    "2018 Q4 Selloff": ("2018-10-03", "2018-12-24"),
+    "2020 COVID Crash": ("2020-02-19", "2020-03-23"),
+    "2020 September Tech": ("2020-09-02", "2020-09-23"),
+    "2022 Rate Selloff": ("2022-01-03", "2022-06-16"),
+    "2022 September CPI": ("2022-08-16", "2022-10-12"),
+    "2023 Regional Banks": ("2023-03-08", "2023-03-17"),
+    "2024 Yen Carry Unwind": ("2024-07-16", "2024-08-05"),
+    "2025 Tariff Shock": ("2025-04-02", "2025-04-08"),
+}
+
+
+def scenario_paths(stock_prices: pd.DataFrame,
+                   windows: List[Tuple[int, int]]) -> np.ndarray:
+    """Return the prices of every ticker in stock_prices in each window of
+    windows, relative to the price at the start of the window.
+
+    A window (start, end) holds the bars after row start up to row end of
+    stock_prices. Shorter windows are padded with their last bar, so the
+    result has shape (windows, longest window, tickers). Tickers without a
+    price at the start of a window stay flat in it.
+    """
+    start = np.array([window[0] for window in windows])
+    end = np.array([window[1] for window in windows])
+    step = np.arange(1, (end - start).max() + 1)
+    # rows of every bar of every window, gathered in one indexing
+    rows = np.minimum(start[:, np.newaxis] + step, end[:, np.newaxis])
+    values = stock_prices.ffill().to_numpy(dtype=np.float32)
+    paths = values[rows] / values[start][:, np.newaxis, :]
+    return np.nan_to_num(paths, nan=1.0)
+
+
+class StressScenario:
+    """Replay historical shocks on the strategy holding, with and without
+    ProtectionBuffer designs.
+
+    Named shocks in scenarios are evaluated together with every window of
+    window days in the last history days, all at once on stored prices.
+
+    === Attributes ===
+    strategy: A strategy that holds the calculated strategy holding
+    scenarios: start and end date of each named shock
+    window: number of trading days of each rolling window
+    history: number of latest trading days the rolling windows cover
+    stride: number of trading days between two rolling windows
+    store: stores the prices of the holding between runs
+    report: P&L, maximum drawdown and triggered stops of each scenario
+    stops: number of triggered layers of each ticker in each scenario, for
+           each buffer design
+    """
+    # Attribute Types
+    strategy: Strategy
+    scenarios: Dict[str, Tuple[str, str]]
+    window: int
+    history: int
+    stride: int
+    store: Checkpoint
+    report: pd.DataFrame
+    stops: Dict[str, pd.DataFrame]
+
+    def __init__(self, strategy: Strategy,
+                 scenarios: Optional[Dict[str, Tuple[str, str]]] = None,
+                 window: int = 5, history: int = 500, stride: int = 1,
+                 store: str = "DataProcessor/stress") -> None:
+        """Initializer to StressScenario.
+        """
+        self.strategy = strategy
+        self.scenarios = SCENARIOS if scenarios is None else scenarios
+        self.window = window
+        self.history = history
+        self.stride = stride
+        self.store = Checkpoint(store)
+        self.report = pd.DataFrame()
+        self.stops = {}
+
+    def __str__(self) -> str:
+        """String representation of StressScenario.
+        """
+        return f"Stress Testing: {len(self.scenarios)} shocks and " \
+               f"{self.window}-day windows"
+
+    def _stock_prices(self, tickers: List[str]) -> pd.DataFrame:
+        """Return the daily prices of tickers since the earliest scenario,
+        downloaded once and stored for later runs.
+        """
+        # the same today as the downloads, so a replayed run is reproduced
+        today = pd.Timestamp(se.today())
+        first = min([pd.Timestamp(start) for start, _ in
+                     self.scenarios.values()] +
+                    [today - pd.Timedelta(days=self.history * 7 // 5)])
+        first -= pd.Timedelta(days=10)
+        if self.store.has("prices"):
+            stored = self.store.load("prices")
+            fresh = stored.index[-1] >= today - pd.Timedelta(days=7)
+            if set(tickers) <= set(stored.columns) and \
+                    stored.index[0] <= first + pd.Timedelta(days=7) and fresh:
+                return stored[tickers]
+        days = (today - first).days
+        stock_prices = se.get_tickers_ohlc(tickers, days)["Adj Close"]
+        self.store.save("prices", stock_prices)
+        return stock_prices
+
+    def _windows(self, index: pd.DatetimeIndex) -> Dict[str, Tuple[int, int]]:
+        """Return the start and end row in index of every scenario covered
+        by index.
+        """
+        windows = {}
+        for name, (start, end) in self.scenarios.items():
+            # the shock starts from the last close on or before start
+            i = index.searchsorted(pd.Timestamp(start), side="right") - 1
+            j = index.searchsorted(pd.Timestamp(end), side="right") - 1
+            if i < 0 or j <= i:
+                print(f"No price history for {name}")
+                continue
+            windows[name] = (i, j)
+        last = len(index) - 1
+        first = max(0, last - self.history)
+        for i in range(first, last - self.window + 1, self.stride):
+            windows[f"{self.window} days from {index[i]:%Y-%m-%d}"] = \
+                (i, i + self.window)
+        return windows
+
+    def evaluate(self, buffers: List[PB]) -> None:
+        """Apply every scenario to the holding at once, without a buffer and
+        with every buffer in buffers. Store results in report and stops.
+        """
+        # setup
+        holding = self.strategy.holding.set_index("ticker")
+        tickers = list(holding.index)
+        stock_prices = self._stock_prices(tickers)
+        windows = self._windows(stock_prices.index)
+        paths = scenario_paths(stock_prices, list(windows.values()))
+        amounts = holding["amount"].to_numpy(dtype=float)
+        prices = stock_prices.ffill().iloc[-1].to_numpy(dtype=float)
+        missing = [ticker for ticker, price in zip(tickers, prices)
+                   if np.isnan(price)]
+        if missing:
+            print("No price history for " + ", ".join(missing))
+        position = np.nan_to_num(np.abs(amounts) * prices)
+        value = position.sum()
+
+        # share of the holding with prices at the start of each scenario
+        start = [window[0] for window in windows.values()]
+        listed = stock_prices.ffill().iloc[start].notna().to_numpy()
+        report = {"days": [window[1] - window[0] for window in
+                           windows.values()],
+                  "coverage": listed @ position / value}
+        long = amounts > 0
+        designs = {"No Buffer": (np.where(long, paths - 1, 1 - paths), None)}
+        for buffer in buffers:
+            designs[str(buffer)] = stop_paths(
+                paths, amounts, buffer.ticker_tolerance(tickers),
+                *buffer.layer_schedule())
+
+        # P&L of the holding on each day of each scenario
+        self.stops = {}
+        for name, (move, triggered) in designs.items():
+            pnl = move @ position
+            balance = value + np.hstack([np.zeros((len(pnl), 1)), pnl])
+            drawdown = 1 - balance / np.maximum.accumulate(balance, axis=1)
+            report[name + " P&L"] = pnl[:, -1]
+            report[name + " Max DD"] = drawdown.max(axis=1)
+            if triggered is not None:
+                layers = triggered.sum(axis=1)
+                report[name + " stops"] = layers.sum(axis=1)
+                self.stops[name] = pd.DataFrame(layers, index=list(windows),
+                                                 columns=tickers)
+        # save results
+        self.report = pd.DataFrame(report, index=list(windows))
+
+
+if __name__ == "__main__":
+    from DataProcessor.DataLoader import DataLoader
+    from ProtectionBuffer.FullStopOrderBuffer import FullStopOrderBuffer
+    from ProtectionBuffer.LadderStopOrderBuffer import LadderStopOrderBuffer
+    strategy = Strategy(DataLoader(), 1200000)
+    strategy.holding = pd.DataFrame({"ticker": ["AAPL", "MSFT", "JPM"],
+                                     "amount": [1000, 800, -500],
+                                     "location": ["US", "US", "US"]})
+    stress = StressScenario(strategy)
+    stress.evaluate([FullStopOrderBuffer(strategy, 0.05),
+                     LadderStopOrderBuffer(strategy, 0.08, 4, "geom")])
+    print(stress.report.head(len(stress.scenarios)))
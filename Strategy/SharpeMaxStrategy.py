@@ -1,13 +1,21 @@
 from Strategy.Strategy import Strategy as Stt
 from DataProcessor.DataLoader import DataLoader
+from DataProcessor.Checkpoint import Checkpoint
 import pandas as pd
 import numpy as np
 from Toolbox import stock_extraction as se
 from Toolbox import kpi
+from Toolbox import trading_calendar as tc
+from Toolbox.streaming_kpi import KPIAccumulator
+from Toolbox.memory_monitor import MemoryMonitor
 from scipy.optimize import minimize, NonlinearConstraint, Bounds
-from typing import Dict, List
+from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.spatial.distance import squareform
+from typing import Dict, List, Optional
 
 import gc
+import time
+from contextlib import nullcontext
 from tqdm import tqdm
 
 
@@ -24,9 +32,9 @@ def _sharpe_portfolio(stock_prices: pd.DataFrame, weight: list) -> float:
     return kpi.sharpe_series(time_series)
 
 
-def _optimize_weight(stock_prices: pd.DataFrame, outlay: float) -> np.array:
-    """Return the optimal amount of stocks that can product maximal Sharpe ratio
-     with stock_prices and outlay.
+def _optimize_weight(stock_prices: pd.DataFrame) -> np.array:
+    """Return the fraction of money held in each stock of stock_prices that
+    can product maximal Sharpe ratio.
     """
     # Initialization of weight
     ticker_num = len(stock_prices.columns)
@@ -40,14 +48,158 @@ def _optimize_weight(stock_prices: pd.DataFrame, outlay: float) -> np.array:
     # 1 additional iteration for more accuracy
     res = minimize(lambda w: -1 * _sharpe_portfolio(stock_prices, w), res.x,
                    bounds=b, constraints=cons)
-    w = res.x
+    # the Sharpe ratio weighs prices by number of shares, so convert the
+    # weights to the value held
+    value = res.x * stock_prices.iloc[-1].to_numpy()
+    return value / value.sum()
+
+
+def _weight_to_quantity(stock_prices: pd.DataFrame, w: np.array,
+                        outlay: float,
+                        cap: Optional[np.array] = None) -> np.array:
+    """Return the amount of stocks of stock_prices holding weights w of
+    outlay, with no weight above cap if given.
+    """
+    quantity = _integer_quantity(stock_prices.iloc[-1].to_numpy(), w, outlay,
+                                 cap)
     # display and return results
-    basket = stock_prices.iloc[-1].dot(w)
-    quantity = (outlay / basket * w).round()
     print(_sharpe_portfolio(stock_prices, quantity))
     return quantity
 
 
+def _integer_quantity(price: np.array, w: np.array, outlay: float,
+                      cap: Optional[np.array] = None,
+                      max_moves: int = 100) -> np.array:
+    """Return whole amounts of stocks at price whose values are closest, in
+    squared dollars, to weights w of outlay, without spending more than
+    outlay or holding more than weights cap.
+
+    Amounts start from the floor of the exact amounts, the money left buys
+    one share at a time of the stock that reduces the error most, and at
+    most max_moves moves of one share (add, remove or swap between two
+    stocks) then improve the result until no move does.
+    """
+    price = np.asarray(price, dtype=float)
+    target = outlay * np.asarray(w, dtype=float)
+    limit = np.full(len(price), np.inf)
+    if cap is not None:
+        limit = np.floor(outlay * np.asarray(cap, dtype=float) / price + 1e-9)
+    quantity = np.clip(np.floor(target / price), 0, limit)
+    money = outlay - price @ quantity
+
+    # largest remainder: buy while a share reduces the error
+    while True:
+        error = price * quantity - target
+        add = np.where((price <= money) & (quantity < limit),
+                       2 * error * price + price ** 2, np.inf)
+        i = add.argmin()
+        if add[i] >= -1e-6:
+            break
+        quantity[i] += 1
+        money -= price[i]
+
+    # local search over single-share moves
+    for _ in range(max_moves):
+        error = price * quantity - target
+        gain = 2 * error * price + price ** 2
+        loss = np.where(quantity > 0, price ** 2 - 2 * error * price, np.inf)
+        add = np.where((price <= money) & (quantity < limit), gain, np.inf)
+        # swap[i, j] buys a share of i with the money of a share of j
+        swap = gain[:, np.newaxis] + loss[np.newaxis, :]
+        affordable = price[:, np.newaxis] <= money + price[np.newaxis, :]
+        swap = np.where(affordable & (quantity < limit)[:, np.newaxis],
+                        swap, np.inf)
+        np.fill_diagonal(swap, np.inf)
+        moves = [add.min(), loss.min(), swap.min()]
+        best = int(np.argmin(moves))
+        if moves[best] >= -1e-6:
+            break
+        if best == 0:
+            i = add.argmin()
+            quantity[i] += 1
+            money -= price[i]
+        elif best == 1:
+            j = loss.argmin()
+            quantity[j] -= 1
+            money += price[j]
+        else:
+            i, j = np.unravel_index(swap.argmin(), swap.shape)
+            quantity[i] += 1
+            quantity[j] -= 1
+            money += price[j] - price[i]
+    return quantity
+
+
+def _liquidity(stock_prices: pd.DataFrame, volume: pd.DataFrame,
+               locations: Dict[str, str]) -> pd.DataFrame:
+    """Return the average daily volume and dollar volume of every ticker of
+    stock_prices, computed for all tickers at once.
+
+    Volume carried forward over the holidays of the exchange of a ticker in
+    locations is not traded, so those rows are left out of its average.
+    """
+    volume = volume.reindex(index=stock_prices.index,
+                            columns=stock_prices.columns)
+    volume = volume.where(~tc.closed(volume, locations))
+    return pd.DataFrame({"ADV": volume.mean(),
+                         "dollar ADV": (volume * stock_prices).mean()})
+
+
+def _cap_weight(w: np.array, cap: np.array) -> np.array:
+    """Return w with every weight at most cap, moving the excess of capped
+    weights to the uncapped ones in proportion to their weight, until no
+    cap is exceeded.
+
+    Only positive weights receive any excess, so a ticker the optimizer left
+    out is never bought. If their caps sum to less than 1, every positive
+    weight is at its cap and the rest stays in cash.
+    """
+    w = np.clip(w, 0, None)
+    cap = np.where(w > 0, np.clip(cap, 0, 1), 0)
+    if cap.sum() <= 1:
+        return cap
+    # every round caps at least one more weight
+    for _ in range(len(w)):
+        excess = np.clip(w - cap, 0, None).sum()
+        if excess <= 1e-12:
+            break
+        w = np.minimum(w, cap)
+        free = np.where(w < cap, w, 0)
+        if free.sum() <= 0:
+            # every weight is capped, and the excess stays in cash
+            break
+        w = w + excess * free / free.sum()
+    return np.minimum(w, cap)
+
+
+def _cluster_candidates(stock_prices: pd.DataFrame,
+                        threshold: float) -> pd.Series:
+    """Return the representative ticker of the cluster of each ticker of
+    stock_prices, where tickers in a cluster have returns correlated above
+    threshold.
+
+    Tickers are clustered hierarchically with average linkage on the
+    distance 1 - correlation. The representative of each cluster is its
+    first ticker, so columns ranked by Sharpe ratio keep the best one.
+    """
+    tickers = list(stock_prices.columns)
+    if len(tickers) < 2:
+        return pd.Series(tickers, index=tickers)
+    stock_return = stock_prices.pct_change().dropna().to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = np.corrcoef(stock_return, rowvar=False)
+    # tickers with constant prices are not correlated with anything
+    distance = np.nan_to_num(1 - corr, nan=1.0)
+    distance = np.clip((distance + distance.T) / 2, 0, 2)
+    np.fill_diagonal(distance, 0)
+    clusters = fcluster(linkage(squareform(distance, checks=False),
+                                method="average"),
+                        t=1 - threshold, criterion="distance")
+    _, first, label = np.unique(clusters, return_index=True,
+                                return_inverse=True)
+    return pd.Series(np.array(tickers)[first[label]], index=tickers)
+
+
 class SharpeMaxStrategy(Stt):
     """ A Strategy that maximizes the Sharpe ratio.
 
@@ -60,6 +212,24 @@ class SharpeMaxStrategy(Stt):
                       in initial stock selection
     optimization_filter: number of days for stock data used
                          in weight optimization
+    chunk_days: if given, stock data in initial stock selection is streamed
+                in chunks of this many days, using constant memory
+    checkpoint: if given, stores results of each industry as they complete,
+                and reuses stored results when the run is restarted
+    cluster_threshold: if given, among candidates whose returns are
+                       correlated above this value only the one with the
+                       highest Sharpe ratio enters weight optimization, and
+                       its weight is shared by the whole cluster
+    cluster_benchmark: whether to also optimize all candidates without
+                       clustering, to measure the time saved by clustering
+    reduction: candidates, optimized dimensions and optimization time of
+               each industry
+    memory: if given, records peak memory of each stage and industry, and
+            switches to compact price data under its budget
+    participation: if given, no position exceeds this fraction of its
+                   average daily dollar volume
+    liquidity: average daily volume, dollar volume, weight cap and weights
+               before and after capping of each optimized ticker
     """
     # Attribute Types
     sharpe_mean: pd.DataFrame
@@ -68,9 +238,23 @@ class SharpeMaxStrategy(Stt):
     stock_num: int
     selection_filter: int
     optimization_filter: int
+    chunk_days: Optional[int]
+    checkpoint: Optional[Checkpoint]
+    cluster_threshold: Optional[float]
+    cluster_benchmark: bool
+    reduction: pd.DataFrame
+    memory: Optional[MemoryMonitor]
+    participation: Optional[float]
+    liquidity: pd.DataFrame
 
     def __init__(self, dc: DataLoader, money: int, stock_num: int,
-                 selection_filter: int, optimization_filter: int) -> None:
+                 selection_filter: int, optimization_filter: int,
+                 chunk_days: Optional[int] = None,
+                 checkpoint: Optional[Checkpoint] = None,
+                 cluster_threshold: Optional[float] = None,
+                 cluster_benchmark: bool = False,
+                 memory: Optional[MemoryMonitor] = None,
+                 participation: Optional[float] = None) -> None:
         """Initializer to SharpeMaxStrategy.
         """
         Stt.__init__(self, dc, money)
@@ -80,6 +264,14 @@ class SharpeMaxStrategy(Stt):
         self.stock_num = stock_num
         self.selection_filter = selection_filter
         self.optimization_filter = optimization_filter
+        self.chunk_days = chunk_days
+        self.checkpoint = checkpoint
+        self.cluster_threshold = cluster_threshold
+        self.cluster_benchmark = cluster_benchmark
+        self.reduction = pd.DataFrame()
+        self.memory = memory
+        self.participation = participation
+        self.liquidity = pd.DataFrame()
 
     def __str__(self) -> str:
         """String representation of SharpeMaxStrategy.
@@ -89,10 +281,26 @@ class SharpeMaxStrategy(Stt):
     def develop_strategy(self) -> None:
         """Inherited method from Strategy.
         """
-        self._select_possible_stocks()
-        self._decide_industry_allocation()
-        self._impose_quota()
-        self._decide_stock_quantity()
+        with self._stage("select"):
+            self._select_possible_stocks()
+        with self._stage("allocate"):
+            self._decide_industry_allocation()
+            self._impose_quota()
+        with self._stage("quantity"):
+            self._decide_stock_quantity()
+
+    def _stage(self, name: str):
+        """Return a context recording the memory of stage name, if memory is
+        monitored.
+        """
+        if self.memory is None:
+            return nullcontext()
+        return self.memory.stage(name)
+
+    def _compact(self) -> bool:
+        """Return whether compact price data should be used.
+        """
+        return self.memory is not None and self.memory.compact
 
     def _select_possible_stocks(self) -> None:
         """Select stocks with positive Sharpe ratio in self.selection_filter
@@ -103,45 +311,98 @@ class SharpeMaxStrategy(Stt):
         stock_df = stock_df.reset_index()
         sharpe_dict = {}
         target = {}
-        sel_filter = self.selection_filter
 
         # store ticker with positive Sharpe ratio
         for ind in tqdm(self.industry_list):
-            tickers_list = list(
-                stock_df["index"][stock_df["GICS Sector\n"] == ind]
-            )
-            pos = []
-            target_list = []
-            for ticker in tickers_list:
-                stock_price, success = se.get_daily_stock(ticker, sel_filter)
-                try:
-                    sharpe = kpi.sharpe(stock_price)
-                except IndexError:
-                    print(ticker)
-                    continue
-                if kpi.volatility(stock_price) == 0:
-                    print(ticker)
-                if sharpe > 0 and success:
-                    pos.append(sharpe)
-                    target_list.append(ticker)
-            # rank stocks by Sharpe Ratio
-            target_list = np.array(target_list)
-            target_list = target_list[np.argsort(pos)[::-1]]
-            mean = np.mean(pos)
-            sharpe_dict[ind] = mean
-            target[ind] = target_list
+            key = "select/" + ind
+            if self.checkpoint is not None and self.checkpoint.has(key):
+                sharpe_dict[ind], target[ind] = self.checkpoint.load(key)
+                continue
+            with self._stage("select/" + ind):
+                tickers_list = list(
+                    stock_df["index"][stock_df["GICS Sector\n"] == ind]
+                )
+                pos = []
+                target_list = []
+                complete = True
+                for ticker in tickers_list:
+                    try:
+                        sharpe, vol, success = self._ticker_kpi(ticker)
+                    except se.NetworkError as e:
+                        # a network failure says nothing about the ticker,
+                        # so it is skipped in this run only
+                        print(f"{ticker} skipped ({e})")
+                        complete = False
+                        continue
+                    except (se.DownloadError, IndexError):
+                        # the download was retried and still has no data
+                        print(ticker)
+                        self.dataloader.exclude(
+                            ticker, self.dataloader.market_of(ticker),
+                            "no data in screening", 30)
+                        continue
+                    if vol == 0:
+                        print(ticker)
+                        self.dataloader.exclude(
+                            ticker, self.dataloader.market_of(ticker),
+                            "zero volatility in screening", 30)
+                    if sharpe > 0 and success:
+                        pos.append(sharpe)
+                        target_list.append(ticker)
+                # rank stocks by Sharpe Ratio
+                target_list = np.array(target_list)
+                target_list = target_list[np.argsort(pos)[::-1]]
+                mean = np.mean(pos)
+                sharpe_dict[ind] = mean
+                target[ind] = target_list
+            # an industry with skipped tickers is screened again on rerun
+            if self.checkpoint is not None and complete:
+                self.checkpoint.save(key, (mean, target_list))
         # remove stock_price garbage
         gc.collect()
+        # never fetch failing tickers again until their exclusion expires
+        self.dataloader.save_exclusion()
 
         # save results
         sharpe_mean = pd.DataFrame.from_dict(sharpe_dict, orient="index")
         self.sharpe_mean = sharpe_mean
         self.target = target
 
+    def _ticker_kpi(self, ticker: str) -> (float, float, bool):
+        """Return the Sharpe ratio and volatility of ticker in
+        self.selection_filter days, and whether the data contains no NaN.
+        Raise IndexError if there is no data.
+        """
+        if self.chunk_days is None:
+            stock_price, success = se.get_daily_stock(ticker,
+                                                      self.selection_filter)
+            if self._compact():
+                # only Adj Close is needed, so release the raw OHLCV
+                stock_price = stock_price[["Adj Close"]].astype(np.float32)
+            return kpi.sharpe(stock_price), kpi.volatility(stock_price), \
+                success
+        # stream the history so that only one chunk is in memory at a time
+        accumulator = KPIAccumulator([ticker])
+        success = True
+        for chunk, s in se.get_daily_chunks(ticker, self.selection_filter,
+                                            self.chunk_days):
+            accumulator.update(chunk[["Adj Close"]].set_axis([ticker], axis=1))
+            success = success and s
+        if accumulator.count[0] == 0:
+            raise IndexError(f"no data for {ticker}")
+        return accumulator.sharpe()[ticker], \
+            accumulator.volatility()[ticker], success
+
     def _decide_industry_allocation(self) -> None:
         """Decide industry allocation for the number of stocks by their average
         performance in Sharpe ratio.
         """
+        # reuse the stored allocation, since it is partly random
+        if self.checkpoint is not None and self.checkpoint.has("allocation"):
+            allocation = self.checkpoint.load("allocation")
+            self.dataloader.industry_df = pd.concat(
+                [self.dataloader.industry_df, allocation], axis=1)
+            return
         allocation = (self.stock_num * self.sharpe_mean / np.sum(
             self.sharpe_mean.values)).round().astype(int)
         # edge case because Telecommunication Services industry
@@ -154,6 +415,8 @@ class SharpeMaxStrategy(Stt):
                 allocation.iloc[i] += 1
             allocation[0]["Telecommunication Services"] = 4
         allocation.columns = ["allocation"]
+        if self.checkpoint is not None:
+            self.checkpoint.save("allocation", allocation)
         # save results
         self.dataloader.industry_df = pd.concat(
             [self.dataloader.industry_df, allocation], axis=1)
@@ -183,18 +446,88 @@ class SharpeMaxStrategy(Stt):
     def _decide_stock_quantity(self) -> None:
         # setup
         holding = []
+        reduction = {}
+        liquidity = []
         # optimize the weight of stocks inside each industry
         for ind in tqdm(self.industry_list):
-            print("current industry is " + ind)
-            tickers = self.target[ind]
-            stock_prices = se.get_tickers_spec(tickers, "Adj Close",
-                                               self.selection_filter // 3)
-            stock_prices = stock_prices[-self.optimization_filter:]
-            weight = _optimize_weight(
-                stock_prices, self.dataloader.industry_df["money"][ind])
-            holding.append(pd.Series(weight, index=tickers, dtype=int))
+            key = "quantity/" + ind
+            if self.checkpoint is not None and self.checkpoint.has(key):
+                holding.append(self.checkpoint.load(key))
+                continue
+            with self._stage("quantity/" + ind):
+                print("current industry is " + ind)
+                tickers = self.target[ind]
+                # fetch exactly optimization_filter sessions of CA and US
+                locations = {ticker: self._location(ticker)
+                             for ticker in tickers}
+                # volume comes with the prices from the same downloads, and
+                # compact mode holds both as float32
+                dtype = np.float32 if self._compact() else None
+                data = se.get_tickers_bars_specs(tickers,
+                                                 ["Adj Close", "Volume"],
+                                                 self.optimization_filter,
+                                                 locations, dtype)
+                stock_prices = data["Adj Close"]
+                outlay = self.dataloader.industry_df["money"][ind]
+                candidates = list(stock_prices.columns)
+                if self.cluster_threshold is not None:
+                    representative = _cluster_candidates(
+                        stock_prices, self.cluster_threshold)
+                else:
+                    representative = pd.Series(candidates, index=candidates)
+                kept = list(representative.unique())
+                # the optimizer works on the few kept tickers in float64
+                start = time.time()
+                weight = _optimize_weight(stock_prices[kept].astype(float))
+                elapsed = time.time() - start
+                full_elapsed = np.nan
+                if self.cluster_benchmark and len(kept) < len(candidates):
+                    start = time.time()
+                    _optimize_weight(stock_prices.astype(float))
+                    full_elapsed = time.time() - start
+                # the members of a cluster share the weight of its
+                # representative, so every candidate of the quota is held
+                size = representative.value_counts()
+                weight = pd.Series(weight, index=kept)[representative] \
+                    .to_numpy() / size[representative].to_numpy()
+                cap = None
+                if self.participation is not None:
+                    weight, cap = self._cap_liquidity(
+                        ind, stock_prices, data["Volume"], weight, outlay,
+                        liquidity)
+                weight = _weight_to_quantity(stock_prices.astype(float),
+                                             weight, outlay, cap)
+                reduction[ind] = {"candidates": len(candidates),
+                                  "optimized": len(kept),
+                                  "seconds": elapsed,
+                                  "full seconds": full_elapsed}
+                holding.append(pd.Series(weight, index=candidates,
+                                         dtype=int))
+            if self.checkpoint is not None:
+                self.checkpoint.save(key, holding[-1])
             gc.collect()
 
+        if liquidity:
+            self.liquidity = pd.concat(liquidity)
+            capped = self.liquidity["weight"] < self.liquidity["optimal"]
+            print(f"liquidity capped {capped.sum()} of "
+                  f"{len(self.liquidity)} positions")
+        # report the dimensions removed by clustering
+        self.reduction = pd.DataFrame.from_dict(reduction, orient="index")
+        if self.cluster_threshold is not None and reduction:
+            removed = (self.reduction["candidates"]
+                       - self.reduction["optimized"]).sum()
+            print(f"clustering removed {removed} of "
+                  f"{self.reduction['candidates'].sum()} dimensions")
+            # only industries where clustering removed a dimension were
+            # optimized twice
+            benchmarked = self.reduction["full seconds"].notna()
+            if self.cluster_benchmark and benchmarked.any():
+                saved = (self.reduction["full seconds"]
+                         - self.reduction["seconds"])[benchmarked].sum()
+                print(f"clustering saved {saved: .3f} seconds in "
+                      f"{benchmarked.sum()} industries")
+
         # reformat the result
         holding = pd.concat(holding)
         holding = pd.DataFrame(holding[holding != 0])
@@ -203,14 +536,38 @@ class SharpeMaxStrategy(Stt):
         # update location for selected tickers
         location = []
         for i in range(len(holding.index)):
-            ticker = holding.iloc[i]["index"]
-            if ticker in list(self.dataloader.sptsx_df.index):
-                location.append("CA")
-            elif ticker in list(self.dataloader.spx_df.index):
-                location.append("US")
-            else:
-                location.append(np.nan)
+            location.append(self._location(holding.iloc[i]["index"]))
         # save results
         holding["location"] = location
         holding = holding.rename(columns={0: "amount", "index": "ticker"})
         self.holding = holding
+
+    def _cap_liquidity(self, ind: str, stock_prices: pd.DataFrame,
+                       volume: pd.DataFrame, weight: np.array, outlay: float,
+                       liquidity: List[pd.DataFrame]) -> \
+            (np.array, np.array):
+        """Return weight with no position above self.participation of its
+        average daily dollar volume, and the weight cap of each position.
+        Append the liquidity of industry ind to liquidity.
+        """
+        locations = {ticker: self._location(ticker)
+                     for ticker in stock_prices.columns}
+        table = _liquidity(stock_prices, volume, locations)
+        # tickers without volume data are not capped
+        cap = (self.participation * table["dollar ADV"] / outlay).fillna(1)
+        capped = _cap_weight(weight, cap.to_numpy())
+        table["industry"] = ind
+        table["cap"] = cap
+        table["optimal"] = weight
+        table["weight"] = capped
+        liquidity.append(table)
+        return capped, cap.to_numpy()
+
+    def _location(self, ticker: str) -> str:
+        """Return "CA" for SPTSX tickers and "US" for SPX tickers.
+        """
+        if ticker in self.dataloader.sptsx_df.index:
+            return "CA"
+        elif ticker in self.dataloader.spx_df.index:
+            return "US"
+        return np.nan
@@ -96,6 +96,118 @@ def calmar_series(ds: pd.Series) -> float:
     return cagr_series(ds) / max_dd_series(ds)
 
 
+def _rolling_std(values: np.ndarray, mask: np.ndarray,
+                 window: int) -> np.ndarray:
+    """Sample standard deviation of the entries of values selected by mask
+    in each trailing window, from running sums.
+    """
+    # center first so that the running sums do not lose precision
+    shift = values[mask].mean() if mask.any() else 0.0
+    centered = np.where(mask, values - shift, 0.0)
+    sums = [np.concatenate([[0.0], np.cumsum(x)]) for x in
+            (mask.astype(float), centered, centered ** 2)]
+    count, total, square = [x[window:] - x[:-window] for x in sums]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = (square - total ** 2 / count) / (count - 1)
+    return np.sqrt(np.where(count > 1, np.clip(var, 0, None), np.nan))
+
+
+def _rolling_returns(ds: pd.Series) -> np.ndarray:
+    """Returns of ds, so that each window of window prices holds
+    window - 1 returns.
+    """
+    prices = ds.to_numpy(dtype=float)
+    return prices[1:] / prices[:-1] - 1
+
+
+def _pad(ds: pd.Series, values: np.ndarray) -> pd.Series:
+    """Return values of the latest windows of ds as a series on ds.index,
+    with NaN where the window is incomplete.
+    """
+    result = np.full(len(ds), np.nan)
+    if len(values):
+        result[-len(values):] = values
+    return pd.Series(result, index=ds.index)
+
+
+def rolling_cagr_series(ds: pd.Series, window: int,
+                        periods: int = 252) -> pd.Series:
+    """cagr_series over each trailing window of window bars.
+    periods is the number of bars per year.
+    """
+    prices = ds.to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        growth = prices[window - 1:] / prices[:len(prices) - window + 1]
+    return _pad(ds, growth ** (periods / window) - 1)
+
+
+def rolling_volatility_series(ds: pd.Series, window: int,
+                              periods: int = 252) -> pd.Series:
+    """volatility_series over each trailing window of window bars, in O(n).
+    """
+    stock_return = _rolling_returns(ds)
+    std = _rolling_std(stock_return, np.isfinite(stock_return), window - 1)
+    return _pad(ds, std * np.sqrt(periods))
+
+
+def rolling_sharpe_series(ds: pd.Series, window: int, rf: float = 0.04,
+                          periods: int = 252) -> pd.Series:
+    """sharpe_series over each trailing window of window bars, in O(n).
+    """
+    return (rolling_cagr_series(ds, window, periods) - rf) / \
+        rolling_volatility_series(ds, window, periods)
+
+
+def rolling_sortino_series(ds: pd.Series, window: int, rf: float = 0.04,
+                           periods: int = 252) -> pd.Series:
+    """Sortino ratio over each trailing window of window bars, in O(n).
+    """
+    # Note: same downside deviation as sortino, divided into excess cagr
+    stock_return = _rolling_returns(ds)
+    neg_vol = _pad(ds, _rolling_std(stock_return, stock_return < 0,
+                                    window - 1))
+    return (rolling_cagr_series(ds, window, periods) - rf) / neg_vol
+
+
+def rolling_max_dd_series(ds: pd.Series, window: int) -> pd.Series:
+    """max_dd_series over each trailing window of window bars, in O(n).
+    """
+    # the peak, trough and drawdown of two adjacent ranges give those of
+    # their union, and every window is the suffix of one block of window bars
+    # followed by the prefix of the next block
+    prices = ds.to_numpy(dtype=float)
+    n = len(prices)
+    if n < window:
+        return _pad(ds, np.empty(0))
+    blocks = -(-n // window)
+    # the padding is never part of a window
+    padded = np.pad(prices, (0, blocks * window - n), mode="edge")
+    padded = padded.reshape(blocks, window)
+
+    # peak, trough and drawdown of each prefix of each block
+    prefix_max = np.maximum.accumulate(padded, axis=1)
+    prefix_min = np.minimum.accumulate(padded, axis=1)
+    prefix_dd = np.maximum.accumulate(1 - padded / prefix_max, axis=1)
+    # peak, trough and drawdown of each suffix of each block
+    reverse = padded[:, ::-1]
+    suffix_max = np.maximum.accumulate(reverse, axis=1)[:, ::-1]
+    suffix_min = np.minimum.accumulate(reverse, axis=1)[:, ::-1]
+    suffix_dd = np.maximum.accumulate(
+        (1 - suffix_min / padded)[:, ::-1], axis=1)[:, ::-1]
+
+    start = np.arange(n - window + 1)
+    end = start + window - 1
+    head = (start // window, start % window)
+    tail = (end // window, end % window)
+    result = np.maximum.reduce([
+        suffix_dd[head], prefix_dd[tail],
+        1 - prefix_min[tail] / suffix_max[head]])
+    # a window aligned with a block is that block alone
+    aligned = start % window == 0
+    result[aligned] = prefix_dd[tail][aligned]
+    return _pad(ds, result)
+
+
 if __name__ == "__main__":
     df, _ = se.get_daily_stock("AAPL", 200)
     print(cagr(df, "Adj Close")[0])
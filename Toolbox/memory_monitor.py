@@ -0,0 +1,95 @@
+import os
+import tracemalloc
+import pandas as pd
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+class MemoryMonitor:
+    """Record the peak memory allocated by each stage of a run with
+    tracemalloc, and switch to compact data once a budget is approached.
+
+    Tracing slows down every allocation severalfold, so call stop() once the
+    monitored stages are done.
+
+    === Attributes ===
+    budget: memory budget in MB, or None for no budget
+    threshold: fraction of budget at which compact mode is switched on
+    compact: whether stages should use compact representations
+    records: peak and retained memory of each finished stage
+    """
+    # Attribute Types
+    budget: Optional[float]
+    threshold: float
+    compact: bool
+    records: List[Dict[str, float]]
+    _peaks: List[int]
+    _started: bool
+
+    def __init__(self, budget: Optional[float] = None,
+                 threshold: float = 0.5) -> None:
+        """Initializer to MemoryMonitor.
+        """
+        self.budget = budget
+        self.threshold = threshold
+        self.compact = False
+        self.records = []
+        self._peaks = []
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+
+    def __str__(self) -> str:
+        """String representation of MemoryMonitor.
+        """
+        return f"Memory Monitor: budget {self.budget} MB"
+
+    @contextmanager
+    def stage(self, name: str) -> None:
+        """Record the peak memory allocated while running the with-block as
+        stage name. Stages may be nested.
+        """
+        # keep the peak reached so far by the enclosing stage
+        start, peak = tracemalloc.get_traced_memory()
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        self._peaks.append(start)
+        # before Python 3.9 the peak cannot be reset, so it is the peak of
+        # the run so far
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(self._peaks.pop(), peak)
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            self.records.append({"stage": name,
+                                 "peak MB": peak / 2 ** 20,
+                                 "retained MB": (current - start) / 2 ** 20,
+                                 "compact": self.compact})
+            if self.budget is not None and not self.compact and \
+                    peak / 2 ** 20 > self.budget * self.threshold:
+                print(f"[{name}] peaked at {peak / 2 ** 20: .1f} MB; "
+                      f"switching to compact mode")
+                self.compact = True
+
+    def stop(self) -> None:
+        """Stop tracing, unless it was started before the monitor.
+        """
+        if self._started and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started = False
+
+    def report(self) -> pd.DataFrame:
+        """Return the records of all stages.
+        """
+        return pd.DataFrame(self.records, columns=["stage", "peak MB",
+                                                   "retained MB", "compact"])
+
+    def document(self, path: str) -> None:
+        """Store the report in path.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.report().to_csv(path, index=False)
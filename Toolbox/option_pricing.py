@@ -0,0 +1,43 @@
+import numpy as np
+from scipy.special import ndtr
+from typing import Dict
+
+
+def _norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x ** 2) / np.sqrt(2 * np.pi)
+
+
+def black_scholes(S: np.ndarray, K: np.ndarray, T: np.ndarray,
+                  sigma: np.ndarray, rf: float = 0.04,
+                  call: np.ndarray = False) -> Dict[str, np.ndarray]:
+    """Black-Scholes price and greeks of European options.
+    All inputs broadcast against each other, so a whole grid of spots,
+    strikes and expiries is priced in one pass.
+    T is in years, and call selects calls over puts.
+    """
+    # Note1: assumes no dividend and constant volatility
+    # Note2: theta is per year and vega per unit of volatility
+    sqrt_t = np.sqrt(T)
+    d1 = (np.log(S / K) + (rf + 0.5 * sigma ** 2) * T) / (sigma * sqrt_t)
+    d2 = d1 - sigma * sqrt_t
+    discount = np.exp(-rf * T)
+    pdf = _norm_pdf(d1)
+    call_price = S * ndtr(d1) - K * discount * ndtr(d2)
+    put_price = K * discount * ndtr(-d2) - S * ndtr(-d1)
+    time_decay = -S * pdf * sigma / (2 * sqrt_t)
+    return {
+        "price": np.where(call, call_price, put_price),
+        "delta": np.where(call, ndtr(d1), ndtr(d1) - 1),
+        "gamma": pdf / (S * sigma * sqrt_t),
+        "vega": S * pdf * sqrt_t,
+        "theta": np.where(call,
+                          time_decay - rf * K * discount * ndtr(d2),
+                          time_decay + rf * K * discount * ndtr(-d2)),
+    }
+
+
+if __name__ == "__main__":
+    result = black_scholes(np.array([100.0]), np.array([90.0, 95.0, 100.0]),
+                           30 / 365, 0.25)
+    for key in result:
+        print(key, result[key])
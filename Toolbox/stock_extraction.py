@@ -1,21 +1,122 @@
+import time
 import datetime
 import numpy as np
 import pandas as pd
 import yfinance as yf
-from typing import List, Dict
+from typing import List, Dict, Iterator, Tuple, Optional
+from DataProcessor.IntradayStore import IntradayStore
+from Toolbox import trading_calendar as tc
+
+# memory-mapped store serving intraday windows; set to None to always
+# download the full window
+intraday_store = IntradayStore("DataProcessor/intraday")
+# number of retries of a failed download, and the first backoff in seconds
+retries = 3
+backoff = 1.0
+# DownloadArchive recording or replaying every download; None to only use
+# the network
+archive = None
+
+
+class DownloadError(Exception):
+    """Raised when a download still returns no data after all retries.
+    """
+    pass
+
+
+class NetworkError(DownloadError):
+    """Raised when a download still fails with an error after all retries.
+    Unlike an empty answer, it says nothing about the ticker.
+    """
+    pass
+
+
+def use_archive(download_archive) -> None:
+    """Serve all downloads through download_archive. The intraday store is
+    switched off, since its downloads depend on the local history.
+    """
+    global archive, intraday_store
+    archive = download_archive
+    intraday_store = None
+
+
+def today() -> datetime.datetime:
+    """Return the current time, or the time archive was recorded if it is
+    set, so that a replay requests the recorded date ranges.
+    """
+    if archive is not None:
+        return archive.today
+    return datetime.datetime.today()
+
+
+def _download(*args, **kwargs) -> pd.DataFrame:
+    """Call yf.download with args and kwargs, through archive if it is set.
+    A download missing from archive fails like one without data.
+    """
+    if archive is None:
+        return _fetch(*args, **kwargs)
+    df = archive.download(_fetch, args, kwargs)
+    if df is None:
+        if kwargs.get("empty_ok", False):
+            return pd.DataFrame()
+        raise DownloadError(f"download of {args[0] if args else kwargs} "
+                            "was not recorded")
+    return df
+
+
+def _fetch(*args, empty_ok: bool = False, **kwargs) -> pd.DataFrame:
+    """Call yf.download with args and kwargs, retrying transient errors with
+    exponential backoff.
+
+    yf.download returns an empty frame instead of raising on most failures,
+    so an empty or all-NaN result is retried too, and raises DownloadError
+    after the last retry, unless empty_ok. Any other error raises
+    NetworkError after the last retry.
+    """
+    for attempt in range(retries + 1):
+        try:
+            df = yf.download(*args, **kwargs)
+            if not empty_ok and (df.empty or df.isna().all().all()):
+                raise DownloadError("no data returned for "
+                                    f"{args[0] if args else kwargs}")
+            return df
+        except Exception as e:
+            if attempt == retries:
+                if isinstance(e, DownloadError):
+                    raise
+                raise NetworkError(f"download of "
+                                   f"{args[0] if args else kwargs} failed "
+                                   f"({e})") from e
+            wait = backoff * 2 ** attempt
+            print(f"Download failed ({e}); retry in {wait: .1f} seconds")
+            time.sleep(wait)
 
 
 def get_intra_stock(ticker: str, days: int) -> (pd.DataFrame, bool):
     """Get intraday data with 5 minutes as interval.
     Return the dataframe and whether if it contains NaN.
+
+    If intraday_store is set, only bars after the stored history are
+    downloaded, and the window is served from the store as float32 bars.
     """
-    end_time = datetime.datetime.today()
+    end_time = today()
     start_time = end_time - datetime.timedelta(days)
-    df = yf.download(ticker, start=start_time, end=end_time, interval="5m",
-                     progress=False)
-    if df.notnull().all().all():
-        return df, True
-    return df.dropna(), False
+    if intraday_store is None:
+        df = _download(ticker, start=start_time, end=end_time, interval="5m",
+                       progress=False)
+        if df.notnull().all().all():
+            return df, True
+        return df.dropna(), False
+
+    # download only the bars after the stored history
+    fetch_start = intraday_store.resume_point(ticker, start_time)
+    # no bar after the stored history is a valid answer out of market hours
+    df = _download(ticker, start=fetch_start, end=end_time, interval="5m",
+                   progress=False, empty_ok=True)
+    success = not df.empty and bool(df.notnull().all().all())
+    # an empty download leaves the stored window to be served as it is
+    intraday_store.write(ticker, df.dropna(), fetch_start)
+    return intraday_store.window(ticker, start_time, end_time), success
 
 
 def get_daily_stock(ticker: str, days: int) -> (pd.DataFrame, bool):
@@ -23,23 +124,51 @@ def get_daily_stock(ticker: str, days: int) -> (pd.DataFrame, bool):
     Return the dataframe and whether if it contains NaN.
     """
     # TODO: can test effect on changes
-    end_time = datetime.datetime.today()
+    end_time = today()
     start_time = end_time - datetime.timedelta(days)
-    df = yf.download(ticker, start=start_time, end=end_time, interval="1d",
-                     progress=False)
+    df = _download(ticker, start=start_time, end=end_time, interval="1d",
+                   progress=False)
     if df.notnull().all().all():
         return df, True
     return df.dropna(), False
 
 
+def get_daily_chunks(ticker: str, days: int, chunk_days: int) -> \
+        Iterator[Tuple[pd.DataFrame, bool]]:
+    """Get daily data as consecutive chunks of chunk_days days, oldest first,
+    so that long histories never need to be held in memory at once.
+    Yield each dataframe and whether if it contains NaN.
+    """
+    end_time = today()
+    start_time = end_time - datetime.timedelta(days)
+    received = False
+    while start_time < end_time:
+        chunk_end = min(start_time + datetime.timedelta(chunk_days), end_time)
+        # chunks over holidays or before listing have no bars
+        df = _download(ticker, start=start_time, end=chunk_end,
+                       interval="1d", progress=False, empty_ok=True)
+        start_time = chunk_end
+        if df.empty:
+            continue
+        received = True
+        if df.notnull().all().all():
+            yield df, True
+        else:
+            yield df.dropna(), False
+    if not received:
+        # confirm with retries, raising DownloadError if there is still no
+        # recent data
+        yield get_daily_stock(ticker, min(days, 30))[0], False
+
+
 def get_monthly_stock(ticker: str, months: int) -> (pd.DataFrame, bool):
     """Get monthly data with 1 day as interval.
     Count 1 month = 30 days.
     Return the dataframe and whether if it contains NaN.
     """
-    end_time = datetime.datetime.today()
+    end_time = today()
     start_time = end_time - datetime.timedelta(months * 30)
-    df = yf.download(ticker, start=start_time, end=end_time, interval="1d", progress=False)
+    df = _download(ticker, start=start_time, end=end_time, interval="1d", progress=False)
     if df.notnull().all().all():
         return df, True
     return df.dropna(), False
@@ -52,9 +181,9 @@ def get_year_stock(ticker: str, year: int) -> (pd.DataFrame, bool):
     """
     # note that sometimes yfinance will return weird datetime, so dropna()
     # will not loss information at all
-    end_time = datetime.datetime.today()
+    end_time = today()
     start_time = end_time - datetime.timedelta(year * 365)
-    df = yf.download(ticker, start=start_time, end=end_time, interval="1mo", progress=False)
+    df = _download(ticker, start=start_time, end=end_time, interval="1mo", progress=False)
     if df.notnull().all().all():
         return df, True
     return df.dropna(), False
@@ -68,16 +197,24 @@ def get_tickers_all(ticker_list: List[str], days: int) -> \
     data_dict = {}
     success = []
     for ticker in ticker_list:
-        data_dict[ticker], s = get_daily_stock(ticker, days)
+        try:
+            data_dict[ticker], s = get_daily_stock(ticker, days)
+        except DownloadError as e:
+            print(e)
+            s = False
         success.append(s)
     return data_dict, np.all(success)
 
 
-def get_tickers_spec(ticker_list: List[str], spec_type: str, days: int) -> \
+def get_tickers_spec(ticker_list: List[str], spec_type: str, days: int,
+                     locations: Optional[Dict[str, str]] = None) -> \
         pd.DataFrame:
     """Get daily data for each valid ticker in ticker_list with spec.
     Return the dataframe and whether if it contains NaN.
 
+    If locations maps tickers to "CA" or "US", the tickers are aligned on
+    their exchange calendars instead of dropping every row with NaN.
+
     Pre-condition: spec_type in ["Open", "High", "Low", "Close",
                                  "Adj Close", "Volume"]
     """
@@ -91,18 +228,114 @@ def get_tickers_spec(ticker_list: List[str], spec_type: str, days: int) -> \
     data_list = []
     success_ticker = []
     for ticker in ticker_list:
-        df, s = get_daily_stock(ticker, days)
+        try:
+            df, s = get_daily_stock(ticker, days)
+        except DownloadError as e:
+            print(e)
+            continue
         if s or len(df.index) > days * 0.75:
             data_list.append(df[spec_type])
             success_ticker.append(ticker)
+    if not data_list:
+        return pd.DataFrame()
     total_df = pd.concat(data_list, axis=1)
-    total_df = total_df.dropna()
     total_df.columns = success_ticker
-    return total_df
+    if locations is not None:
+        return tc.align(total_df, locations)
+    return total_df.dropna()
+
+
+def get_tickers_bars(ticker_list: List[str], spec_type: str, bars: int,
+                     locations: Dict[str, str]) -> pd.DataFrame:
+    """Get exactly the latest bars daily bars for each valid ticker in
+    ticker_list with spec, aligned on the exchange calendars of locations.
+    Only the calendar range holding bars sessions, and the session before
+    them, is downloaded.
+
+    Pre-condition: spec_type in ["Open", "High", "Low", "Close",
+                                 "Adj Close", "Volume"]
+    """
+    return get_tickers_bars_specs(ticker_list, [spec_type], bars,
+                                  locations)[spec_type]
+
+
+def get_tickers_bars_specs(ticker_list: List[str], spec_list: List[str],
+                           bars: int, locations: Dict[str, str],
+                           dtype=None) -> Dict[str, pd.DataFrame]:
+    """Get exactly the latest bars daily bars for each valid ticker in
+    ticker_list, with a dataframe for each spec in spec_list, from the same
+    downloads as get_tickers_bars. Only the columns in spec_list of each
+    download are kept, cast to dtype if given.
+
+    Pre-condition: every spec in spec_list is in ["Open", "High", "Low",
+                   "Close", "Adj Close", "Volume"]
+    """
+    end_time = today()
+    # one more session, so that a ticker whose exchange is closed on the
+    # first session still has a price to carry forward into it
+    start_time = tc.bars_start(
+        bars + 1, [locations.get(ticker, "US") for ticker in ticker_list],
+        end_time.date())
+    data_list = []
+    success_ticker = []
+    for ticker in ticker_list:
+        try:
+            df = _download(ticker, start=start_time, end=end_time,
+                           interval="1d", progress=False)
+        except DownloadError as e:
+            print(e)
+            continue
+        if df.notnull().all().all() or len(df.dropna().index) > bars * 0.75:
+            df = df[spec_list]
+            data_list.append(df if dtype is None else df.astype(dtype))
+            success_ticker.append(ticker)
+    if not data_list:
+        return {spec: pd.DataFrame() for spec in spec_list}
+    result = {}
+    for spec in spec_list:
+        total_df = pd.concat([df[spec] for df in data_list], axis=1)
+        total_df.columns = success_ticker
+        result[spec] = tc.align(total_df, locations)[-bars:]
+    return result
+
+
+def get_tickers_ohlc(ticker_list: List[str], days: int) -> \
+        Dict[str, pd.DataFrame]:
+    """Get daily data for all tickers in ticker_list in one batched download.
+    Return a dataframe for each of "Open", "High", "Low", "Close",
+    "Adj Close" and "Volume", with one column per ticker.
+    """
+    end_time = today()
+    start_time = end_time - datetime.timedelta(days)
+    df = _download(ticker_list, start=start_time, end=end_time,
+                   interval="1d", group_by="column", progress=False)
+    valid_list = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+    if not isinstance(df.columns, pd.MultiIndex):
+        # a single ticker is returned without the ticker level
+        return {spec: df[[spec]].set_axis(ticker_list, axis=1)
+                for spec in valid_list}
+    return {spec: df[spec].reindex(columns=ticker_list) for spec in valid_list}
 
 
 def get_current_price(ticker: str) -> float:
-    return get_intra_stock(ticker, 4)[0]["Adj Close"].iloc[-1]
+    return float(get_intra_stock(ticker, 4)[0]["Adj Close"].iloc[-1])
+
+
+def get_current_prices(ticker_list: List[str]) -> Dict[str, Optional[float]]:
+    """Get the latest intraday price of all tickers in ticker_list in one
+    batched download. Tickers without a price in the last 4 days map to None.
+    """
+    end_time = today()
+    start_time = end_time - datetime.timedelta(4)
+    df = _download(ticker_list, start=start_time, end=end_time, interval="5m",
+                   group_by="column", progress=False)
+    if isinstance(df.columns, pd.MultiIndex):
+        latest = df["Adj Close"].reindex(columns=ticker_list).ffill().iloc[-1]
+    else:
+        # a single ticker is returned without the ticker level
+        latest = pd.Series(df["Adj Close"].ffill().iloc[-1], index=ticker_list)
+    return {ticker: None if pd.isna(price) else float(price)
+            for ticker, price in latest.items()}
 
 
 if __name__ == "__main__":
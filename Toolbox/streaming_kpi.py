@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+from typing import List
+
+
+class KPIAccumulator:
+    """Streaming versions of the statistics in Toolbox.kpi.
+
+    Prices are consumed chunk by chunk, oldest first, with one column per
+    ticker. Only a fixed number of running values is kept per ticker, so the
+    memory used does not depend on the length of the history.
+
+    === Attributes ===
+    tickers: tickers tracked, in column order
+    periods: number of bars per year
+    count: number of valid prices seen
+    first: first non-zero price
+    last: last non-zero price
+    prev: last valid price, used for the return across chunks
+    ret_count: number of returns seen
+    ret_mean: running mean of returns
+    ret_m2: running sum of squared deviations of returns (Welford)
+    neg_count: number of negative returns seen
+    neg_mean: running mean of negative returns
+    neg_m2: running sum of squared deviations of negative returns
+    peak: running maximum price
+    drawdown: running maximum drawdown
+    """
+    # Attribute Types
+    tickers: List[str]
+    periods: int
+    count: np.ndarray
+    first: np.ndarray
+    last: np.ndarray
+    prev: np.ndarray
+    ret_count: np.ndarray
+    ret_mean: np.ndarray
+    ret_m2: np.ndarray
+    neg_count: np.ndarray
+    neg_mean: np.ndarray
+    neg_m2: np.ndarray
+    peak: np.ndarray
+    drawdown: np.ndarray
+
+    def __init__(self, tickers: List[str], periods: int = 252) -> None:
+        """Initializer to KPIAccumulator.
+        """
+        n = len(tickers)
+        self.tickers = list(tickers)
+        self.periods = periods
+        self.count = np.zeros(n)
+        self.first = np.full(n, np.nan)
+        self.last = np.full(n, np.nan)
+        self.prev = np.full(n, np.nan)
+        self.ret_count = np.zeros(n)
+        self.ret_mean = np.zeros(n)
+        self.ret_m2 = np.zeros(n)
+        self.neg_count = np.zeros(n)
+        self.neg_mean = np.zeros(n)
+        self.neg_m2 = np.zeros(n)
+        self.peak = np.full(n, np.nan)
+        self.drawdown = np.full(n, np.nan)
+
+    def __str__(self) -> str:
+        """String representation of KPIAccumulator.
+        """
+        return f"KPI Accumulator: {len(self.tickers)} tickers"
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Consume the next chunk of prices, with one column per ticker.
+        Missing prices are skipped.
+        """
+        prices = chunk.reindex(columns=self.tickers).to_numpy(dtype=float)
+        if len(prices) == 0:
+            return
+        valid = ~np.isnan(prices)
+        self.count += valid.sum(axis=0)
+
+        # first and last non-zero prices for CAGR
+        non_zero = valid & (prices != 0)
+        has = non_zero.any(axis=0)
+        first_idx = non_zero.argmax(axis=0)
+        last_idx = len(prices) - 1 - non_zero[::-1].argmax(axis=0)
+        cols = np.arange(prices.shape[1])
+        self.first = np.where(np.isnan(self.first) & has,
+                              prices[first_idx, cols], self.first)
+        self.last = np.where(has, prices[last_idx, cols], self.last)
+
+        # returns between consecutive valid prices, across chunks
+        previous = pd.DataFrame(np.vstack([self.prev, prices])).ffill()
+        previous = previous.to_numpy()[:-1]
+        returns = np.where(valid, prices / previous - 1, np.nan)
+        self.prev = np.where(valid.any(axis=0),
+                             pd.DataFrame(prices).ffill().to_numpy()[-1],
+                             self.prev)
+        self.ret_count, self.ret_mean, self.ret_m2 = _merge_moments(
+            self.ret_count, self.ret_mean, self.ret_m2, returns)
+        negative = np.where(returns < 0, returns, np.nan)
+        self.neg_count, self.neg_mean, self.neg_m2 = _merge_moments(
+            self.neg_count, self.neg_mean, self.neg_m2, negative)
+
+        # running peak for maximum drawdown
+        peak = np.fmax.accumulate(np.vstack([self.peak, prices]), axis=0)[1:]
+        self.peak = peak[-1]
+        dd = np.where(valid, 1 - prices / peak, np.nan)
+        self.drawdown = np.fmax(self.drawdown, np.nanmax(
+            np.vstack([np.full(len(self.tickers), np.nan), dd]), axis=0))
+
+    def cagr(self) -> pd.Series:
+        """Compounded Annual Growth Return, as kpi.cagr.
+        """
+        n = self.count / self.periods
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return pd.Series((self.last / self.first) ** (1 / n) - 1,
+                             index=self.tickers)
+
+    def volatility(self) -> pd.Series:
+        """Annualized standard deviation of returns, as kpi.volatility.
+        """
+        return pd.Series(_std(self.ret_count, self.ret_m2)
+                         * np.sqrt(self.periods), index=self.tickers)
+
+    def sharpe(self, rf: float = 0.04) -> pd.Series:
+        """Sharpe Ratio, as kpi.sharpe.
+        """
+        return (self.cagr() - rf) / self.volatility()
+
+    def sortino(self, rf: float = 0.04) -> pd.Series:
+        """Sortino Ratio, as kpi.sortino.
+        """
+        neg_vol = pd.Series(_std(self.neg_count, self.neg_m2),
+                            index=self.tickers)
+        return (self.cagr() - rf) / neg_vol
+
+    def max_dd(self) -> pd.Series:
+        """Maximum Drawdown, as kpi.max_dd.
+        """
+        return pd.Series(self.drawdown, index=self.tickers)
+
+    def calmar(self) -> pd.Series:
+        """Calmar Ratio, as kpi.calmar.
+        """
+        return self.cagr() / self.max_dd()
+
+
+def _merge_moments(count: np.ndarray, mean: np.ndarray, m2: np.ndarray,
+                   values: np.ndarray) -> (np.ndarray, np.ndarray,
+                                           np.ndarray):
+    """Merge the running count, mean and sum of squared deviations with the
+    non-NaN entries of values in each column (Chan et al. update of
+    Welford's algorithm).
+    """
+    valid = ~np.isnan(values)
+    n_b = valid.sum(axis=0)
+    sum_b = np.where(valid, values, 0).sum(axis=0)
+    mean_b = np.divide(sum_b, n_b, out=np.zeros_like(sum_b), where=n_b > 0)
+    m2_b = np.where(valid, values - mean_b, 0)
+    m2_b = (m2_b ** 2).sum(axis=0)
+    n = count + n_b
+    delta = mean_b - mean
+    ratio = np.divide(n_b, n, out=np.zeros_like(sum_b), where=n > 0)
+    return (n, mean + delta * ratio,
+            m2 + m2_b + delta ** 2 * count * ratio)
+
+
+def _std(count: np.ndarray, m2: np.ndarray) -> np.ndarray:
+    """Return the sample standard deviation from count and m2.
+    """
+    return np.sqrt(np.divide(m2, count - 1, out=np.full(len(m2), np.nan),
+                             where=count > 1))
@@ -1,7 +1,6 @@
 import pandas as pd
 from Toolbox import stock_extraction as se
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 def macd(DF: pd.DataFrame, spec: str = "Adj Close", a: int = 12, b: int = 26,
@@ -36,6 +35,18 @@ def atr(DF: pd.DataFrame, n: int = 14) -> pd.DataFrame:
     return df[["ATR"]]
 
 
+def atr_panel(high: pd.DataFrame, low: pd.DataFrame, close: pd.DataFrame,
+              n: int = 14) -> pd.DataFrame:
+    """Average True Range of many tickers at once.
+    Each input has one column per ticker, as in stock_extraction.get_tickers_ohlc.
+    """
+    # Note: same true range and smoothing as atr(), computed column-wise
+    prev_close = close.shift(1)
+    tr = np.maximum(np.maximum(high - low, (high - prev_close).abs()),
+                    (low - prev_close).abs())
+    return tr.ewm(span=n, min_periods=n).mean()
+
+
 def bollinger_bands(DF: pd.DataFrame, spec: str = "Adj Close", n: int = 14)\
         -> pd.DataFrame:
     """volatility indicator.
@@ -84,6 +95,7 @@ def adx(DF: pd.DataFrame, n: int = 20) -> pd.DataFrame:
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
     df, _ = se.get_daily_stock("AAPL", 200)
     sig_macd = macd(df, "Adj Close")
     sig_atr = atr(df)
@@ -0,0 +1,128 @@
+import datetime
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import AbstractHolidayCalendar, Holiday, \
+    GoodFriday, USMartinLutherKingJr, USPresidentsDay, USMemorialDay, \
+    USLaborDay, USThanksgivingDay, nearest_workday, sunday_to_monday, \
+    next_monday, next_monday_or_tuesday
+from pandas.tseries.offsets import DateOffset, CustomBusinessDay
+from dateutil.relativedelta import MO
+from typing import Dict, List
+
+
+class NYSECalendar(AbstractHolidayCalendar):
+    """Holidays of the New York Stock Exchange.
+    """
+    rules = [
+        Holiday("New Years Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01",
+                observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4,
+                observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+class TSXCalendar(AbstractHolidayCalendar):
+    """Holidays of the Toronto Stock Exchange.
+    """
+    rules = [
+        Holiday("New Years Day", month=1, day=1, observance=next_monday),
+        Holiday("Family Day", month=2, day=1, start_date="2008-01-01",
+                offset=DateOffset(weekday=MO(3))),
+        GoodFriday,
+        Holiday("Victoria Day", month=5, day=24,
+                offset=DateOffset(weekday=MO(-1))),
+        Holiday("Canada Day", month=7, day=1, observance=next_monday),
+        Holiday("Civic Holiday", month=8, day=1,
+                offset=DateOffset(weekday=MO(1))),
+        Holiday("Labour Day", month=9, day=1,
+                offset=DateOffset(weekday=MO(1))),
+        Holiday("Thanksgiving", month=10, day=1,
+                offset=DateOffset(weekday=MO(2))),
+        Holiday("Christmas", month=12, day=25, observance=next_monday),
+        Holiday("Boxing Day", month=12, day=26,
+                observance=next_monday_or_tuesday),
+    ]
+
+
+# exchange calendar of each holding location
+CALENDARS = {"CA": TSXCalendar(), "US": NYSECalendar()}
+
+
+def trading_days(location: str, start, end) -> pd.DatetimeIndex:
+    """Return the sessions of the exchange of location in [start, end].
+    """
+    day = CustomBusinessDay(calendar=CALENDARS[location])
+    return pd.date_range(pd.Timestamp(start).normalize(),
+                         pd.Timestamp(end).normalize(), freq=day)
+
+
+def bars_start(bars: int, locations: List[str],
+               end=None) -> datetime.datetime:
+    """Return the earliest start date such that a download ending at end
+    (exclusive, today by default) contains bars sessions of the union of
+    the exchanges of locations.
+    """
+    end = pd.Timestamp(datetime.date.today() if end is None else end)
+    # a session every 7 / 5 calendar days plus holidays is a safe first guess
+    start = end - pd.Timedelta(days=bars * 7 // 5 + 15)
+    while True:
+        sessions = union_days(locations, start, end - pd.Timedelta(days=1))
+        if len(sessions) >= bars:
+            return sessions[-bars].to_pydatetime()
+        start -= pd.Timedelta(days=bars)
+
+
+def union_days(locations: List[str], start, end) -> pd.DatetimeIndex:
+    """Return the dates in [start, end] on which any exchange of locations
+    trades.
+    """
+    sessions = pd.DatetimeIndex([])
+    for location in set(locations):
+        sessions = sessions.union(trading_days(location, start, end))
+    return sessions
+
+
+def closed(prices: pd.DataFrame, locations: Dict[str, str]) -> pd.DataFrame:
+    """Return whether the exchange of each ticker of prices, with one column
+    per ticker, is closed on the date of each row. Tickers without a known
+    location are always open.
+    """
+    dates = prices.index.normalize()
+    result = pd.DataFrame(False, index=prices.index, columns=prices.columns)
+    if prices.empty:
+        return result
+    for ticker in prices.columns:
+        location = locations.get(ticker)
+        if location in CALENDARS:
+            sessions = trading_days(location, dates.min(), dates.max())
+            result[ticker] = ~np.asarray(dates.isin(sessions))
+    return result
+
+
+def align(prices: pd.DataFrame, locations: Dict[str, str],
+          dropna: bool = True) -> pd.DataFrame:
+    """Return prices, with one column per ticker, aligned on the union of
+    the sessions of their exchanges.
+
+    A ticker is carried forward on the holidays of its own exchange, so a
+    TSX holiday does not remove a NYSE session, and vice versa. Rows that
+    still miss data after that are dropped if dropna.
+    """
+    if prices.empty:
+        return prices
+    filled = prices.where(~closed(prices, locations), prices.ffill())
+    return filled.dropna() if dropna else filled
+
+
+if __name__ == "__main__":
+    print(trading_days("CA", "2022-12-20", "2023-01-10"))
+    print(trading_days("US", "2022-12-20", "2023-01-10"))
+    print(bars_start(20, ["CA", "US"]))
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from Toolbox import stock_extraction as se
+from Toolbox import trading_calendar as tc
+from typing import Dict
+
+
+class BatchEvaluator:
+    """Evaluate many holdings at once on one shared price matrix.
+
+    The shared matrix keeps the dates on which some tickers have no price,
+    and each portfolio is evaluated on the dates on which all of its tickers
+    have prices, so a short history only shortens the portfolios holding it.
+
+    === Attributes ===
+    holdings: holding of each portfolio, with ticker, amount and location
+    days: number of days of prices used
+    prices: prices of the union of all tickers, one column per ticker
+    weight: amount of each ticker (rows) in each portfolio (columns)
+    portfolio: balance of each portfolio in time series, NaN on the dates
+               on which some of its tickers have no price
+    kpi_df: KPI's of each portfolio
+    incomplete: number of dates evaluated and tickers without a price on
+                some date, for each portfolio not evaluated on every date
+    """
+    # Attribute Types
+    holdings: Dict[str, pd.DataFrame]
+    days: int
+    prices: pd.DataFrame
+    weight: pd.DataFrame
+    portfolio: pd.DataFrame
+    kpi_df: pd.DataFrame
+    incomplete: pd.DataFrame
+
+    def __init__(self, holdings: Dict[str, pd.DataFrame],
+                 days: int = 50) -> None:
+        """Initializer to BatchEvaluator.
+        """
+        self.holdings = dict(holdings)
+        self.days = days
+        self.prices = pd.DataFrame()
+        self.weight = pd.DataFrame()
+        self.portfolio = pd.DataFrame()
+        self.kpi_df = pd.DataFrame()
+        self.incomplete = pd.DataFrame()
+
+    def __str__(self) -> str:
+        """String representation of BatchEvaluator.
+        """
+        return f"Evaluating {len(self.holdings)} Portfolios"
+
+    def add_url(self, name: str, url: str) -> None:
+        """Add the holding published at url, in the format read by
+        Visualizer, as portfolio name.
+        """
+        from Visualizer.Visualizer import Visualizer
+        visualizer = Visualizer(url)
+        visualizer.fetch_holding()
+        self.holdings[name] = visualizer.holding
+
+    def evaluate(self) -> None:
+        """Fetch prices once for all tickers, and calculate the balance and
+        KPI's of every portfolio. Store results in prices, weight, portfolio,
+        kpi_df and incomplete.
+        """
+        # setup: one holdings matrix over the union of tickers
+        amounts = {name: holding.groupby("ticker")["amount"].sum()
+                   for name, holding in self.holdings.items()}
+        weight = pd.DataFrame(amounts).fillna(0).astype(float)
+        locations = {}
+        for holding in self.holdings.values():
+            if "location" in holding.columns:
+                locations.update(zip(holding["ticker"], holding["location"]))
+        # one batched download, with a column for every ticker even without
+        # prices, carried only over the holidays of its own exchange
+        prices = se.get_tickers_ohlc(list(weight.index), self.days)[
+            "Adj Close"]
+        prices = tc.align(prices, locations, dropna=False).dropna(how="all")
+
+        # all balances as one matrix product, on the dates on which every
+        # ticker of the portfolio has a price
+        held = weight.to_numpy() != 0
+        priced = prices.notna().to_numpy()
+        valid = priced.astype(int) @ held.astype(int) == held.sum(axis=0)
+        balance = np.nan_to_num(prices.to_numpy(dtype=float)) @ \
+            weight.to_numpy()
+        portfolio = pd.DataFrame(np.where(valid, balance, np.nan),
+                                 index=prices.index, columns=weight.columns)
+
+        # report the portfolios not evaluated on every date
+        rows = valid.sum(axis=0)
+        unpriced = ~priced.all(axis=0)
+        incomplete = pd.DataFrame({
+            "dates": rows,
+            "missing": [", ".join(weight.index[held[:, i] & unpriced])
+                        for i in range(len(weight.columns))]},
+            index=weight.columns)[rows < len(prices)]
+        for name, row in incomplete.iterrows():
+            print(f"{name} evaluated on {row['dates']} of {len(prices)} "
+                  f"dates; missing prices for {row['missing']}")
+        # save results
+        self.prices = prices
+        self.weight = weight
+        self.portfolio = portfolio
+        self.kpi_df = batch_kpi(portfolio)
+        self.incomplete = incomplete
+
+
+def batch_kpi(portfolio: pd.DataFrame, rf: float = 0.04,
+              periods: int = 252) -> pd.DataFrame:
+    """Return the KPI's of Toolbox.kpi for each column of portfolio, computed
+    for all columns at once. Each column is computed over its own non-NaN
+    rows only.
+    """
+    n = portfolio.count() / periods
+    first = portfolio.bfill().iloc[0]
+    last = portfolio.ffill().iloc[-1]
+    # returns from the previous row with a balance
+    stock_return = portfolio / portfolio.ffill().shift(1) - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cagr = (last / first) ** (1 / n) - 1
+        vol = stock_return.std(ddof=1) * np.sqrt(periods)
+        neg_vol = stock_return.where(stock_return < 0).std()
+        max_dd = (1 - portfolio / portfolio.cummax()).max()
+        return pd.DataFrame({"cagr": cagr,
+                             "Sharpe Ratio": (cagr - rf) / vol,
+                             "Sortino Ratio": (cagr - rf) / neg_vol,
+                             "Maximum Drawdown": max_dd,
+                             "Calmar Ratio": cagr / max_dd},
+                            index=portfolio.columns)
+
+
+if __name__ == "__main__":
+    evaluator = BatchEvaluator({
+        "tech": pd.DataFrame({"ticker": ["AAPL", "MSFT"],
+                              "amount": [100, 50]}),
+        "banks": pd.DataFrame({"ticker": ["JPM", "BAC", "MSFT"],
+                               "amount": [80, 300, 10]}),
+    })
+    evaluator.evaluate()
+    print(evaluator.kpi_df)
+    print(evaluator.incomplete)
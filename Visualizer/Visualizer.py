@@ -14,20 +14,26 @@ class Visualizer:
     holding: current holding
     kpi_df: store KPI's for holding
     portfolio: balance with current holding in time series
+    window: number of bars in each window of rolling_kpi
+    rolling_kpi: KPI's for holding over each trailing window
     """
     # Attribute Types
     url: str
     holding: pd.DataFrame
     kpi_df: pd.DataFrame
     portfolio: pd.DataFrame
+    window: int
+    rolling_kpi: pd.DataFrame
 
-    def __init__(self, url: str) -> None:
+    def __init__(self, url: str, window: int = 10) -> None:
         """Initializer to Visualizer.
         """
         self.url = url
         self.holding = pd.DataFrame()
         self.kpi_df = pd.DataFrame()
         self.portfolio = pd.DataFrame()
+        self.window = window
+        self.rolling_kpi = pd.DataFrame()
 
     def __str__(self) -> str:
         """String representation of Visualizer.
@@ -49,7 +55,12 @@ class Visualizer:
         """
         # setup
         tickers = list(self.holding["ticker"])
-        stock_prices = se.get_tickers_spec(tickers, "Adj Close", 50)
+        locations = None
+        if "location" in self.holding.columns:
+            locations = dict(zip(self.holding["ticker"],
+                                 self.holding["location"]))
+        stock_prices = se.get_tickers_spec(tickers, "Adj Close", 50,
+                                           locations)
         weight = self.holding[["amount"]]
         weight.index = stock_prices.columns
         weight["amount"] = weight["amount"].astype(float)
@@ -75,8 +86,23 @@ class Visualizer:
                                           "Calmar Ratio"])
         self.portfolio = portfolio
 
+    def summarize_rolling_kpi(self) -> None:
+        """Calculate KPI over each trailing window of the portfolio and
+        store in rolling_kpi.
+
+        Precondition: summarize_kpi() has been called.
+        """
+        ds = self.portfolio["amount"]
+        self.rolling_kpi = pd.DataFrame({
+            "Sharpe Ratio": kpi.rolling_sharpe_series(ds, self.window),
+            "Sortino Ratio": kpi.rolling_sortino_series(ds, self.window),
+            "Volatility": kpi.rolling_volatility_series(ds, self.window),
+            "Maximum Drawdown": kpi.rolling_max_dd_series(ds, self.window),
+        })
+
     def visualize(self) -> None:
-        """Plot the portfolio time series and save it in /prediction/.
+        """Plot the portfolio time series and rolling KPI's and save them in
+        /prediction/.
         """
         # plot
         fig = plt.figure()
@@ -86,6 +112,11 @@ class Visualizer:
         prediction_path = "prediction/"
         title = str(date.today())
         plt.savefig(prediction_path + title)
+        if not self.rolling_kpi.empty:
+            axes = self.rolling_kpi.plot(
+                subplots=True, figsize=(8, 10),
+                title=f"{self.window}-day rolling KPI")
+            axes[0].get_figure().savefig(prediction_path + title + "_rolling")
         plt.show()
 
     def document(self) -> None:
@@ -95,4 +126,5 @@ class Visualizer:
         writer = pd.ExcelWriter(f"prediction/{title}.xlsx")
         self.holding.to_excel(writer, sheet_name="holding")
         self.kpi_df.to_excel(writer, sheet_name="kpi")
+        self.rolling_kpi.to_excel(writer, sheet_name="rolling kpi")
         writer.save()
@@ -0,0 +1,278 @@
+"""Run the pipeline of main.py one stage at a time.
+
+Each stage stores its output in the artifact directory, so any later stage
+can run on its own. Heavy dependencies are imported only by the stages that
+need them.
+
+    python cli.py load
+    python cli.py screen --selection-filter 100
+    python cli.py optimize --money 1200000 --stock-num 80
+    python cli.py rebalance
+    python cli.py buffer --kind ladder --tolerance 0.08 --layer 4
+    python cli.py store
+    python cli.py monitor --interval 0.5
+    python cli.py visualize
+
+Record every download of a stage with --record archive/run.zip, and rerun it
+offline with --replay archive/run.zip.
+"""
+import argparse
+import sys
+import time
+from contextlib import contextmanager
+
+from DataProcessor.Checkpoint import Checkpoint
+
+URL = "https://docs.google.com/spreadsheets/d/1hS4vtC7ekVef1fdf1KDb7DbemyOiqfgz3OZ62vxrTNM/edit#gid=0"
+
+
+@contextmanager
+def timer(name: str) -> None:
+    """This function is used for display time taken."""
+    s = time.time()
+    yield
+    elapsed = time.time() - s
+    print(f"[{name}] takes {elapsed: .3f} seconds")
+
+
+def _dataloader(artifacts: Checkpoint):
+    """Return a DataLoader restored from the stored universe.
+    """
+    from DataProcessor.DataLoader import DataLoader
+    dataloader = DataLoader()
+    dataloader.read_exclusion()
+    universe = artifacts.load("universe")
+    dataloader.sptsx_df = universe["sptsx_df"]
+    dataloader.spx_df = universe["spx_df"]
+    dataloader.etf_df = universe["etf_df"]
+    dataloader.industry_df = universe["industry_df"]
+    return dataloader
+
+
+def _strategy(args: argparse.Namespace, artifacts: Checkpoint):
+    """Return a SharpeMaxStrategy on the stored universe.
+    """
+    from Strategy.SharpeMaxStrategy import SharpeMaxStrategy
+    checkpoint = None
+    if args.checkpoint is not None:
+        checkpoint = Checkpoint(args.checkpoint)
+    return SharpeMaxStrategy(_dataloader(artifacts), args.money,
+                             args.stock_num, args.selection_filter,
+                             args.optimization_filter,
+                             chunk_days=args.chunk_days,
+                             checkpoint=checkpoint,
+                             cluster_threshold=args.cluster_threshold,
+                             participation=args.participation)
+
+
+def load(args: argparse.Namespace, artifacts: Checkpoint) -> None:
+    """Read the tradable universe and store it as "universe".
+    """
+    from DataProcessor.DataLoader import DataLoader
+    dataloader = DataLoader()
+    with timer(str(dataloader)):
+        dataloader.read_data()
+    if args.check_quality:
+        from DataProcessor.DataQuality import DataQuality
+        quality = DataQuality(dataloader)
+        with timer(str(quality)):
+            quality.screen()
+    dataloader.count_industry()
+    artifacts.save("universe", {"sptsx_df": dataloader.sptsx_df,
+                                "spx_df": dataloader.spx_df,
+                                "etf_df": dataloader.etf_df,
+                                "industry_df": dataloader.industry_df})
+
+
+def screen(args: argparse.Namespace, artifacts: Checkpoint) -> None:
+    """Select stocks with positive Sharpe ratio and store them as "targets".
+    """
+    strategy = _strategy(args, artifacts)
+    with timer(str(strategy)):
+        strategy._select_possible_stocks()
+    artifacts.save("targets", {"target": strategy.target,
+                               "sharpe_mean": strategy.sharpe_mean})
+
+
+def optimize(args: argparse.Namespace, artifacts: Checkpoint) -> None:
+    """Allocate and optimize the stored targets, and store the result as
+    "holding".
+    """
+    strategy = _strategy(args, artifacts)
+    targets = artifacts.load("targets")
+    strategy.target = targets["target"]
+    strategy.sharpe_mean = targets["sharpe_mean"]
+    with timer(str(strategy)):
+        strategy._decide_industry_allocation()
+        strategy._impose_quota()
+        strategy._decide_stock_quantity()
+    artifacts.save("holding", strategy.holding)
+
+
+def rebalance(args: argparse.Namespace, artifacts: Checkpoint) -> None:
+    """Compare the stored holding with the published one, and store the
+    delta orders and changed positions as "rebalance".
+    """
+    from DataProcessor.Rebalancer import Rebalancer
+    from Visualizer.Visualizer import Visualizer
+    current = Visualizer(args.url.replace('/edit#gid=',
+                                          '/export?format=csv&gid='))
+    current.fetch_holding()
+    rebalancer = Rebalancer(current.holding, artifacts.load("holding"))
+    with timer(str(rebalancer)):
+        rebalancer.compute()
+    artifacts.save("rebalance", {"delta": rebalancer.delta,
+                                 "changed": rebalancer.changed,
+                                 "cancel": rebalancer.cancel})
+
+
+def buffer(args: argparse.Namespace, artifacts: Checkpoint) -> None:
+    """Create a buffer for the stored holding and store it as "buffer".
+    """
+    from DataProcessor.DataLoader import DataLoader
+    from Strategy.Strategy import Strategy
+    strategy = Strategy(DataLoader(), args.money)
+    if args.changed_only:
+        strategy.holding = artifacts.load("rebalance")["changed"]
+    else:
+        strategy.holding = artifacts.load("holding")
+    if args.kind == "full":
+        from ProtectionBuffer.FullStopOrderBuffer import FullStopOrderBuffer
+        protection = FullStopOrderBuffer(strategy, args.tolerance,
+                                         args.atr_multiple)
+    elif args.kind == "ladder":
+        from ProtectionBuffer.LadderStopOrderBuffer import \
+            LadderStopOrderBuffer
+        protection = LadderStopOrderBuffer(strategy, args.tolerance,
+                                           args.layer, args.method,
+                                           args.atr_multiple)
+    else:
+        from ProtectionBuffer.OptionBuffer import OptionBuffer
+        protection = OptionBuffer(strategy, args.tolerance)
+    with timer(str(protection)):
+        protection.create_buffer()
+        protection.remove_zero_buffer()
+    artifacts.save("buffer", protection.buffer)
+
+
+def store(args: argparse.Namespace, artifacts: Checkpoint) -> None:
+    """Write the stored holding and buffer to the holding template.
+    """
+    import pandas as pd
+    from DataProcessor.DataStorer import DataStorer
+    holding = artifacts.load("holding")
+    orders = holding
+    if args.delta:
+        orders = artifacts.load("rebalance")["delta"]
+    writer = pd.ExcelWriter(args.holding_path)
+    data_storer = DataStorer(writer)
+    with timer(str(data_storer)):
+        data_storer.store_buy(orders, artifacts.load("buffer"))
+        data_storer.store_hold(holding)
+
+
+def monitor(args: argparse.Namespace, artifacts: Checkpoint) -> None:
+    """Watch the stop orders of the stored buffer against live quotes.
+    """
+    from ProtectionBuffer.StopMonitor import StopMonitor, YFinanceFeed
+    stop_monitor = StopMonitor(artifacts.load("buffer"),
+                               YFinanceFeed(), args.interval)
+    with timer(str(stop_monitor)):
+        stop_monitor.watch(args.cycles)
+    print(stop_monitor.metrics())
+    artifacts.save("triggers", stop_monitor.report())
+
+
+def visualize(args: argparse.Namespace, artifacts: Checkpoint) -> None:
+    """Visualize the published holding and document it in /prediction/.
+    """
+    from Visualizer.Visualizer import Visualizer
+    url = args.url.replace('/edit#gid=', '/export?format=csv&gid=')
+    visualizer = Visualizer(url)
+    with timer(str(visualizer)):
+        visualizer.fetch_holding()
+        visualizer.summarize_kpi()
+        visualizer.summarize_rolling_kpi()
+        visualizer.visualize()
+        visualizer.document()
+
+
+def main(argv=None) -> None:
+    """Parse argv and run the requested stage.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--artifacts", default="artifacts",
+                        help="directory storing the output of each stage")
+    parser.add_argument("--money", type=int, default=1200000)
+    parser.add_argument("--record", default=None,
+                        help="archive recording every download")
+    parser.add_argument("--replay", default=None,
+                        help="archive replaying recorded downloads")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds each replayed download waits")
+    stages = parser.add_subparsers(dest="stage", required=True)
+
+    sub = stages.add_parser("load", help=load.__doc__)
+    sub.add_argument("--check-quality", action="store_true",
+                     help="exclude tickers with unusable data first")
+    for stage in [screen, optimize]:
+        sub = stages.add_parser(stage.__name__, help=stage.__doc__)
+        sub.add_argument("--stock-num", type=int, default=100)
+        sub.add_argument("--selection-filter", type=int, default=80)
+        sub.add_argument("--optimization-filter", type=int, default=20)
+        sub.add_argument("--chunk-days", type=int, default=None)
+        sub.add_argument("--checkpoint", default=None,
+                         help="directory to resume an interrupted run")
+        sub.add_argument("--cluster-threshold", type=float, default=None,
+                         help="merge candidates correlated above this value")
+        sub.add_argument("--participation", type=float, default=None,
+                         help="largest fraction of daily dollar volume held")
+
+    sub = stages.add_parser("rebalance", help=rebalance.__doc__)
+    sub.add_argument("--url", default=URL)
+
+    sub = stages.add_parser("buffer", help=buffer.__doc__)
+    sub.add_argument("--changed-only", action="store_true",
+                     help="buffer only positions changed by rebalance")
+    sub.add_argument("--kind", choices=["full", "ladder", "option"],
+                     default="full")
+    sub.add_argument("--tolerance", type=float, default=0.05)
+    sub.add_argument("--layer", type=int, default=4)
+    sub.add_argument("--method", choices=["equal", "geom"], default="geom")
+    sub.add_argument("--atr-multiple", type=float, default=None)
+
+    sub = stages.add_parser("store", help=store.__doc__)
+    sub.add_argument("--holding-path", default="holding.xlsx")
+    sub.add_argument("--delta", action="store_true",
+                     help="store only the orders computed by rebalance")
+
+    sub = stages.add_parser("monitor", help=monitor.__doc__)
+    sub.add_argument("--interval", type=float, default=1.0,
+                     help="seconds between two polls of all tickers")
+    sub.add_argument("--cycles", type=int, default=None,
+                     help="number of polls, until all stops trigger if unset")
+
+    sub = stages.add_parser("visualize", help=visualize.__doc__)
+    sub.add_argument("--url", default=URL)
+
+    args = parser.parse_args(argv)
+    stage = {"load": load, "screen": screen, "optimize": optimize,
+             "rebalance": rebalance, "buffer": buffer, "store": store,
+             "monitor": monitor, "visualize": visualize}
+    archive = None
+    if args.record is not None or args.replay is not None:
+        from DataProcessor.DownloadArchive import DownloadArchive
+        from Toolbox import stock_extraction as se
+        if args.record is not None:
+            archive = DownloadArchive(args.record, "record")
+        else:
+            archive = DownloadArchive(args.replay, "replay", args.latency)
+        se.use_archive(archive)
+    stage[args.stage](args, Checkpoint(args.artifacts))
+    if archive is not None:
+        archive.close()
+        print(archive.stats())
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,13 +1,20 @@
 import time
 import pandas as pd
+from datetime import date
 from contextlib import contextmanager
 
 from DataProcessor.DataLoader import DataLoader
 from DataProcessor.DataStorer import DataStorer
+from DataProcessor.Checkpoint import Checkpoint
+from DataProcessor.DataQuality import DataQuality
+from DataProcessor.Rebalancer import Rebalancer
 from Strategy.SharpeMaxStrategy import SharpeMaxStrategy
 from ProtectionBuffer.FullStopOrderBuffer import FullStopOrderBuffer
 from ProtectionBuffer.LadderStopOrderBuffer import LadderStopOrderBuffer
+from ProtectionBuffer.BufferEvaluator import BufferEvaluator
+from ProtectionBuffer.StressScenario import StressScenario
 from Visualizer.Visualizer import Visualizer
+from Toolbox import stock_extraction as se
 
 
 @contextmanager
@@ -20,21 +27,73 @@ def timer(name: str) -> None:
 
 
 #%% Preparation
+# record every download to rerun and profile the pipeline offline
+archive = None
+# from DataProcessor.DownloadArchive import DownloadArchive
+# archive = DownloadArchive(f"archive/{date.today()}.zip", "record")
+# archive = DownloadArchive("archive/2023-01-06.zip", "replay", latency=0.1)
+if archive is not None:
+    se.use_archive(archive)
 money = 1200000
+url = "https://docs.google.com/spreadsheets/d/1hS4vtC7ekVef1fdf1KDb7DbemyOiqfgz3OZ62vxrTNM/edit#gid=0"
+url = url.replace('/edit#gid=', '/export?format=csv&gid=')
 dataloader = DataLoader()
 
+quality = DataQuality(dataloader)
+
 with timer(str(dataloader)):
     dataloader.read_data()
+with timer(str(quality)):
+    quality.screen()
+with timer(str(dataloader)):
     dataloader.count_industry()
 
 #%% Develop Strategy
-strategy = SharpeMaxStrategy(dataloader, money, 100, 80, 20)
+# rerunning on the same day resumes from the last completed industry
+checkpoint = Checkpoint(f"checkpoint/{date.today()}")
+# record peak memory and switch to compact price data when the run nears
+# 512 MB; tracing slows the run down, so it is off by default
+memory = None
+# from Toolbox.memory_monitor import MemoryMonitor
+# memory = MemoryMonitor(budget=512)
+# no position exceeds 5% of its average daily dollar volume
+strategy = SharpeMaxStrategy(dataloader, money, 100, 80, 20,
+                             checkpoint=checkpoint, cluster_threshold=0.9,
+                             memory=memory, participation=0.05)
 with timer(str(strategy)):
     strategy.develop_strategy()
+if memory is not None:
+    memory.stop()
+    memory.document(f"{checkpoint.root}/memory.csv")
+    print(memory.report())
+
+#%% Compare with current holding
+current = Visualizer(url)
+current.fetch_holding()
+rebalancer = Rebalancer(current.holding, strategy.holding)
+with timer(str(rebalancer)):
+    rebalancer.compute()
+
+#%% Compare Buffer designs
+evaluator = BufferEvaluator(strategy)
+with timer(str(evaluator)):
+    evaluator.evaluate([FullStopOrderBuffer(strategy, 0.05),
+                        LadderStopOrderBuffer(strategy, 0.08, 4, "geom")])
+print(evaluator.report)
+
+#%% Stress test with historical shocks
+stress = StressScenario(strategy)
+with timer(str(stress)):
+    stress.evaluate([FullStopOrderBuffer(strategy, 0.05),
+                     LadderStopOrderBuffer(strategy, 0.08, 4, "geom")])
+print(stress.report.head(len(stress.scenarios)))
 
 #%% Add Buffer
-buffer = FullStopOrderBuffer(strategy, 0.05)
-# buffer = LadderStopOrderBuffer(strategy, 0.08, 4, "geom")
+# only changed positions need new stop orders
+changed = rebalancer.restrict(strategy)
+buffer = FullStopOrderBuffer(changed, 0.05)
+# buffer = LadderStopOrderBuffer(changed, 0.08, 4, "geom")
+# buffer = FullStopOrderBuffer(changed, 0.05, atr_multiple=2)
 with timer(str(buffer)):
     buffer.create_buffer()
     buffer.remove_zero_buffer()
@@ -44,15 +103,20 @@ holding_path = "holding.xlsx"
 writer = pd.ExcelWriter(holding_path)
 data_storer = DataStorer(writer)
 with timer(str(data_storer)):
-    data_storer.store_buy(strategy.holding, buffer.buffer)
+    data_storer.store_buy(rebalancer.delta, buffer.buffer)
     data_storer.store_hold(strategy.holding)
 
+print("cancel stop orders of " + ", ".join(rebalancer.cancel))
+
 #%% Visualize Result
-url = "https://docs.google.com/spreadsheets/d/1hS4vtC7ekVef1fdf1KDb7DbemyOiqfgz3OZ62vxrTNM/edit#gid=0"
-url = url.replace('/edit#gid=', '/export?format=csv&gid=')
 visualizer = Visualizer(url)
 with timer(str(visualizer)):
     visualizer.fetch_holding()
     visualizer.summarize_kpi()
+    visualizer.summarize_rolling_kpi()
     visualizer.visualize()
     visualizer.document()
+
+if archive is not None:
+    archive.close()
+    print(archive.stats())